@@ -1 +1,26 @@
-from .qagent import QAgent
\ No newline at end of file
+from .qagent import QAgent
+from .dyna import DynaQAgent
+from .traces import QLambdaAgent, SarsaLambdaAgent
+
+# make_agent(agent_type=...): "q" is Q-learning (Dyna-Q with planning_steps > 0)
+AGENT_TYPES = {"q": QAgent, "qlambda": QLambdaAgent, "sarsa-lambda": SarsaLambdaAgent}
+
+
+def make_agent(num_states, num_actions, planning_steps=0, agent_type="q", lam=0.9, **kwargs):
+    """
+    QAgent, or DynaQAgent when planning_steps > 0, or one of the eligibility-trace
+    agents for agent_type "qlambda" / "sarsa-lambda" (with trace decay lam).
+    kwargs go to the agent constructor.
+    """
+    if agent_type not in AGENT_TYPES:
+        raise ValueError(f"unknown agent type {agent_type!r}; expected one of {sorted(AGENT_TYPES)}")
+    if agent_type != "q":
+        if planning_steps > 0:
+            raise ValueError("Dyna planning only works with the 'q' agent")
+        # Sparse Q-tables get sparse traces unless the caller says otherwise:
+        # a dense trace table would be as big as the dense Q
+        kwargs.setdefault("sparse_traces", kwargs.get("sparse", False))
+        return AGENT_TYPES[agent_type](num_states, num_actions, lam=lam, **kwargs)
+    if planning_steps > 0:
+        return DynaQAgent(num_states, num_actions, planning_steps=planning_steps, **kwargs)
+    return QAgent(num_states, num_actions, **kwargs)
@@ -0,0 +1,123 @@
+import os
+import json
+import random
+import numpy as np
+
+from agent.sparse_q import SparseQTable
+
+# Bump when the checkpoint layout changes so old files are rejected clearly
+CHECKPOINT_VERSION = 2
+
+
+def atomic_write(path, write):
+    """Call write(file) on a temp file next to path, then rename it over path."""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_q_table(path, Q):
+    """
+    np.save(path, Q) that never leaves a half-written file behind if the process dies mid-write.
+
+    A SparseQTable is saved in its stored form instead (Q_states / Q_values, see
+    SparseQTable.checkpoint_state) as an .npz next to path (q_table_level3.npy ->
+    q_table_level3.npz), so the file grows with the visited states, not with the
+    full state space. Returns the path written.
+    """
+    if isinstance(Q, SparseQTable):
+        path = os.path.splitext(path)[0] + ".npz"
+        arrays = Q.checkpoint_state()
+        atomic_write(path, lambda f: np.savez(f, num_states=np.int64(Q.num_states),
+                                              initial_value=np.array(Q.initial_value, dtype=Q.dtype),
+                                              **arrays))
+    else:
+        atomic_write(path, lambda f: np.save(f, Q))
+    return path
+
+
+def load_q_table(path, mmap_mode=None):
+    """
+    Read a table written by save_q_table: an np.ndarray from an .npy, or a
+    SparseQTable from a sparse .npz (never expanded to dense). If path does not
+    exist but the same name with the other suffix does, that file is read, so
+    "q_table_level3.npy" also finds a sparse q_table_level3.npz.
+    mmap_mode is passed to np.load for dense tables.
+    """
+    if not os.path.exists(path):
+        stem, ext = os.path.splitext(path)
+        other = stem + (".npz" if ext == ".npy" else ".npy")
+        if os.path.exists(other):
+            path = other
+    data = np.load(path, mmap_mode=mmap_mode)
+    if not isinstance(data, np.lib.npyio.NpzFile):
+        return data
+    with data:
+        states, values = data["Q_states"], data["Q_values"]
+        Q = SparseQTable(int(data["num_states"]), values.shape[1], initial_value=data["initial_value"].item(),
+                         capacity=max(len(states), 1), dtype=values.dtype)
+        Q.restore_checkpoint_state({"Q_states": states, "Q_values": values})
+    return Q
+
+
+def save_checkpoint(path, agent, episode, level=0, returns=None):
+    """
+    Atomically write everything needed to continue a training run exactly:
+    the agent's Q-table and learning state (epsilon, replay buffer, Dyna model,
+    the NumPy RNG states of exploration, replay and planning), the episode
+    counter, the level, the returns so far and the state of Python's `random`
+    module (which seeds agents built without an explicit seed).
+
+    Args:
+        path (str): checkpoint file (.npz).
+        agent (QAgent): agent being trained.
+        episode (int): number of episodes finished on this level.
+        level (int): level index being trained.
+        returns (list | None): per-episode returns so far.
+    """
+    arrays, agent_meta = agent.checkpoint_state()
+    meta = {
+        "version": CHECKPOINT_VERSION,
+        "agent": type(agent).__name__,
+        "agent_state": agent_meta,
+        "episode": episode,
+        "level": level,
+        "returns": [float(r) for r in (returns or [])],
+        "random_state": random.getstate(),
+    }
+    atomic_write(path, lambda f: np.savez(f, meta=np.array(json.dumps(meta)), **arrays))
+
+
+def load_checkpoint(path):
+    """Read a checkpoint; returns (arrays, meta) with meta as written by save_checkpoint."""
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        arrays = {k: data[k] for k in data.files if k != "meta"}
+    if meta.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path}: unsupported checkpoint version {meta.get('version')}")
+    return arrays, meta
+
+
+def restore_checkpoint(agent, arrays, meta):
+    """
+    Put a freshly built agent (same kind and sizes as the saved one) and the
+    `random` module back into the checkpointed state.
+    Returns (episode, level, returns) to continue the training loop from.
+    """
+    if meta["agent"] != type(agent).__name__:
+        raise ValueError(f"checkpoint is for a {meta['agent']}, not a {type(agent).__name__}")
+    agent.restore_checkpoint_state(arrays, meta["agent_state"])
+
+    version, internal, gauss = meta["random_state"]
+    random.setstate((version, tuple(internal), gauss))
+    return meta["episode"], meta["level"], list(meta["returns"])
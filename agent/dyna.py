@@ -0,0 +1,92 @@
+import numpy as np
+from agent.qagent import QAgent
+
+
+class DynaQAgent(QAgent):
+    """
+    Dyna-Q: Q-learning plus planning with a learned model of the environment.
+
+    GridWorldEnv is deterministic, so the model is just the last outcome seen
+    for each (state, action) pair, stored as arrays:
+        model_next    (num_states, num_actions) int    next state
+        model_reward  (num_states, num_actions) float  reward
+        model_done    (num_states, num_actions) bool   True if the move ended the episode
+
+    After every real update, planning_steps remembered pairs are drawn at
+    random and replayed through the model as one vectorized update_batch call,
+    so each real step (and, in the visual trainers, each rendered frame and
+    delay) teaches the agent much more.
+    """
+
+    def __init__(self, num_states, num_actions, planning_steps=10, **kwargs):
+        """
+        Args:
+            num_states, num_actions, **kwargs: as for QAgent.
+            planning_steps (int): simulated updates per real step (0 = plain Q-learning).
+        """
+        super().__init__(num_states, num_actions, **kwargs)
+        if self.sparse:
+            # The model below is dense over num_states, which a sparse encoding makes huge
+            raise ValueError("DynaQAgent needs a dense Q-table; use the cell state encoding")
+        self.planning_steps = planning_steps
+
+        self.model_next = np.zeros((num_states, num_actions), dtype=np.int64)
+        self.model_reward = np.zeros((num_states, num_actions), dtype=np.float64)
+        self.model_done = np.zeros((num_states, num_actions), dtype=bool)
+
+        # Flat s * num_actions + a ids of the pairs seen so far, in first-seen order
+        self._seen = np.zeros(num_states * num_actions, dtype=bool)
+        self._seen_pairs = np.zeros(num_states * num_actions, dtype=np.int64)
+        self._num_seen = 0
+
+        #its own child of the agent's seed, independent of exploration and replay
+        self.rng = np.random.default_rng(self.seed_seq.spawn(1)[0])
+
+    def update(self, state, action, reward, next_state, done):
+        """Learn from the real transition, remember it in the model, then plan."""
+        super().update(state, action, reward, next_state, done)
+        self.remember(state, action, reward, next_state, done)
+        if self.planning_steps:
+            self.plan(self.planning_steps)
+
+    def remember(self, state, action, reward, next_state, done):
+        """Record the latest outcome of (state, action) in the model."""
+        pair = state * self.num_actions + action
+        if not self._seen[pair]:
+            self._seen[pair] = True
+            self._seen_pairs[self._num_seen] = pair
+            self._num_seen += 1
+        # A finishing move's next state belongs to the next level; done makes it unused
+        self.model_next[state, action] = state if done else next_state
+        self.model_reward[state, action] = reward
+        self.model_done[state, action] = done
+
+    def checkpoint_state(self):
+        arrays, meta = super().checkpoint_state()
+        arrays.update(model_next=self.model_next, model_reward=self.model_reward,
+                      model_done=self.model_done, model_seen_pairs=self._seen_pairs[:self._num_seen])
+        meta["dyna"] = {"rng": self.rng.bit_generator.state}
+        return arrays, meta
+
+    def restore_checkpoint_state(self, arrays, meta):
+        super().restore_checkpoint_state(arrays, meta)
+        if "dyna" not in meta:
+            raise ValueError("checkpoint was not written by a DynaQAgent")
+        self.model_next[:] = arrays["model_next"]
+        self.model_reward[:] = arrays["model_reward"]
+        self.model_done[:] = arrays["model_done"]
+        seen = arrays["model_seen_pairs"]
+        self._num_seen = len(seen)
+        self._seen_pairs[:self._num_seen] = seen
+        self._seen[:] = False
+        self._seen[seen] = True
+        self.rng.bit_generator.state = meta["dyna"]["rng"]
+
+    def plan(self, steps):
+        """Apply steps simulated updates for randomly drawn remembered (state, action) pairs."""
+        if not self._num_seen:
+            return
+        pairs = self._seen_pairs[self.rng.integers(self._num_seen, size=steps)]
+        states, actions = np.divmod(pairs, self.num_actions)
+        self.update_batch(states, actions, self.model_reward[states, actions],
+                          self.model_next[states, actions], self.model_done[states, actions])
@@ -0,0 +1,221 @@
+"""
+Versioned archive of trained Q-tables.
+
+An archive is a directory holding one table file per level plus a
+manifest.json describing each table:
+
+    models/default/
+        manifest.json
+        level0.npy
+        level1.npy
+        ...
+
+    manifest.json:
+    {
+      "format": "treatquest-qtables",
+      "version": 1,
+      "levels": {
+        "0": {"file": "level0.npy", "level_file": "levels/level1.txt",
+              "level_hash": "<sha1 of the level file>", "grid_shape": [5, 5],
+              "state_encoding": "cell", "num_states": 9, "num_actions": 4, "dtype": "float64",
+              "sparse": false, "hyperparams": {"alpha": 0.9, ...}, "episodes": 1000, "saved": "..."}
+      }
+    }
+
+Dense tables are stored as uncompressed .npy so load() can memory-map them:
+opening is instant whatever the size, and processes mapping the same file share
+its pages. Sparse tables (SparseQTable, from the cell_treats encoding) are stored
+as level{N}.npz holding only their visited rows, with "sparse": true; they load
+back as a SparseQTable.
+Rows follow GridWorldEnv's compact state numbering (walkable cells only); older
+tables with one row per grid cell are converted when added or loaded.
+
+Build an archive from loose q_table_level{N}.npy files:
+    python -m agent.model_archive --out models/default
+    python -m agent.model_archive --out models/shipped --pattern "Trained Q-tables/q_table_level{level}.npy"
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+from agent.checkpoint import atomic_write, save_q_table, load_q_table
+from agent.sparse_q import SparseQTable
+from env.level_compiler import compile_level
+
+ARCHIVE_FORMAT = "treatquest-qtables"
+ARCHIVE_VERSION = 1
+MANIFEST = "manifest.json"
+
+
+class ModelArchive:
+    """
+    Read and write one archive directory.
+
+    Args:
+        path (str): archive directory; created on the first add().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest = {"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION, "levels": {}}
+        manifest_path = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("format") != ARCHIVE_FORMAT or manifest.get("version") != ARCHIVE_VERSION:
+                raise ValueError(f"{manifest_path}: not a version {ARCHIVE_VERSION} {ARCHIVE_FORMAT} manifest")
+            self.manifest = manifest
+
+    def levels(self):
+        """Level indices stored in the archive, in order."""
+        return sorted(int(k) for k in self.manifest["levels"])
+
+    def info(self, level):
+        """Manifest entry (metadata dict) for one level."""
+        try:
+            return self.manifest["levels"][str(level)]
+        except KeyError:
+            raise KeyError(f"{self.path} has no Q-table for level {level}") from None
+
+    def add(self, level, Q, level_file, hyperparams=None, episodes=None, state_encoding="cell"):
+        """
+        Store (or replace) the Q-table for one level and record its metadata.
+        The table and the manifest are each written atomically.
+
+        Args:
+            level (int): level index the table was trained on.
+            Q (np.ndarray | SparseQTable): table shaped (num_states, num_actions), in
+                compact state numbering or with one row per grid cell (converted here).
+            level_file (str): the level text file it was trained on (hashed for later checks).
+            hyperparams (dict | None): training settings worth keeping (alpha, gamma, ...).
+            episodes (int | None): episodes trained.
+            state_encoding (str): GridWorldEnv state encoding the table is indexed by.
+                A sparse table (SparseQTable) is stored as its visited rows only.
+        """
+        compiled = compile_level(level_file)
+        rows, cols = compiled.shape
+        num_masks = 1 << len(compiled.treats) if state_encoding == "cell_treats" else 1
+        Q = compact_legacy_table(Q, compiled, num_masks)
+        num_states = num_masks * compiled.num_walkable
+        if Q.ndim != 2 or Q.shape[0] != num_states:
+            raise ValueError(f"Q-table shape {Q.shape} does not fit {level_file} "
+                             f"({rows}x{cols} grid, {state_encoding} encoding = {num_states} states)")
+
+        os.makedirs(self.path, exist_ok=True)
+        sparse = isinstance(Q, SparseQTable)
+        if not sparse:
+            Q = np.ascontiguousarray(Q)
+        path = save_q_table(os.path.join(self.path, f"level{level}.npy"), Q)
+        file_name = os.path.basename(path)
+        old = self.manifest["levels"].get(str(level), {}).get("file")
+
+        self.manifest["levels"][str(level)] = {
+            "file": file_name,
+            "level_file": level_file,
+            "level_hash": compiled.source_hash,
+            "grid_shape": [rows, cols],
+            "state_encoding": state_encoding,
+            "num_states": int(Q.shape[0]),
+            "num_actions": int(Q.shape[1]),
+            "dtype": str(Q.dtype),
+            "sparse": sparse,
+            "hyperparams": hyperparams,
+            "episodes": episodes,
+            "saved": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        text = json.dumps(self.manifest, indent=2, sort_keys=True)
+        atomic_write(os.path.join(self.path, MANIFEST), lambda f: f.write(text.encode("utf-8")))
+        if old is not None and old != file_name and os.path.exists(os.path.join(self.path, old)):
+            os.remove(os.path.join(self.path, old))  # replaced by a table of the other kind
+
+    def load(self, level, env=None, mmap_mode="r"):
+        """
+        Open one level's Q-table.
+
+        Args:
+            level (int): level index.
+            env (GridWorldEnv | None): if given (reset to that level), the table is
+                checked against the env's map: same level file hash and num_states.
+                A table saved with one row per grid cell is converted to the env's
+                compact numbering first (as an in-memory copy).
+            mmap_mode (str | None): np.load mmap_mode; "r" shares read-only pages,
+                "c" gives a private copy-on-write view (for agents that keep learning),
+                None reads the whole table into memory. Sparse tables are always
+                read into memory (they only hold the visited rows).
+
+        Returns:
+            np.ndarray, or SparseQTable for a sparse entry, shaped (num_states, num_actions).
+        """
+        entry = self.info(level)
+        Q = load_q_table(os.path.join(self.path, entry["file"]),
+                         mmap_mode=None if entry.get("sparse") else mmap_mode)
+        if list(Q.shape) != [entry["num_states"], entry["num_actions"]]:
+            raise ValueError(f"{self.path} level {level}: table shape {Q.shape} disagrees with the manifest")
+        if env is not None:
+            if env.compact_states:
+                Q = compact_legacy_table(Q, env.level, env.num_states // len(env.cell_of_state))
+            check_table(Q, env, level_hash=entry["level_hash"], name=f"{self.path} level {level}")
+        return Q
+
+
+def compact_legacy_table(Q, level, num_masks=1):
+    """
+    Return Q in compact state numbering. Tables from before walkable-cell
+    compaction have one row per grid cell (per treat mask) and are converted
+    with level.compact_table; anything else is returned unchanged.
+    """
+    if (Q.ndim == 2 and Q.shape[0] == num_masks * level.tiles.size
+            and level.num_walkable != level.tiles.size):
+        return level.compact_table(np.asarray(Q))
+    return Q
+
+
+def check_table(Q, env, level_hash=None, name="Q-table"):
+    """Raise ValueError unless Q fits the level env is currently on (and was trained on that map)."""
+    if Q.shape != (env.num_states, env.num_actions):
+        raise ValueError(f"{name} has shape {Q.shape}, but the level needs "
+                         f"({env.num_states}, {env.num_actions})")
+    if level_hash is not None and level_hash != env.level.source_hash:
+        raise ValueError(f"{name} was trained on a different version of {env.level.source}")
+
+
+def build_archive(out, pattern="q_table_level{level}.npy", level_files=None, first_number=0):
+    """
+    Collect loose .npy tables into an archive.
+
+    pattern may use {level} (0-based level index) or {n} (level index + first_number),
+    e.g. "tables/level_{n}.npy" with first_number=1 for files numbered from 1.
+    A sparse table saved as .npz next to the .npy name is picked up as well.
+    Missing files are skipped. Returns the ModelArchive.
+    """
+    if level_files is None:
+        from train import LEVEL_FILES
+        level_files = LEVEL_FILES
+    archive = ModelArchive(out)
+    for level, level_file in enumerate(level_files):
+        path = pattern.format(level=level, n=level + first_number)
+        if not (os.path.exists(path) or os.path.exists(os.path.splitext(path)[0] + ".npz")):
+            print(f"Skipping level {level}: {path} not found")
+            continue
+        Q = load_q_table(path)
+        # Only the cell_treats encoding trains sparse tables
+        archive.add(level, Q, level_file,
+                    state_encoding="cell_treats" if isinstance(Q, SparseQTable) else "cell")
+        print(f"Added level {level} from {path}")
+    return archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a Q-table archive from loose .npy files")
+    parser.add_argument("--out", required=True, help="archive directory to create or update")
+    parser.add_argument("--pattern", default="q_table_level{level}.npy",
+                        help="table file per level; {level} = 0-based index, {n} = index + --first-number")
+    parser.add_argument("--first-number", type=int, default=0, help="number {n} stands for at level 0")
+    args = parser.parse_args()
+    build_archive(args.out, pattern=args.pattern, first_number=args.first_number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import numpy as np
+from env.gridworld_env import (GridWorldEnv, TILES, REWARDS, TERMINAL_TILES,
+                               EMPTY, TREAT, FINISHED)
+from agent.model_archive import ModelArchive
+
+# 2**MAX_PLANNING_TREATS treat masks are planned over; keeps memory bounded
+MAX_PLANNING_TREATS = 16
+
+
+def build_model(env):
+    """
+    Expand the env's static transition tables into the full deterministic MDP
+    over (treat mask, cell) pairs, for the level env is currently on. Cells are
+    grid cells (row * cols + col), like the env's transition tables.
+
+    Returns a dict of arrays, each shaped (num_masks, num_cells, num_actions):
+        next   flat index mask' * num_cells + cell' of the successor
+        reward immediate reward (same REWARDS table step() uses)
+        done   True if the move ends the episode (trap or last treat)
+    """
+    num_treats = int(env.treat_index.max()) + 1
+    if num_treats > MAX_PLANNING_TREATS:
+        raise ValueError(f"level has {num_treats} treats; planning supports at most {MAX_PLANNING_TREATS}")
+
+    num_states, num_actions = env.next_cell.shape
+    masks = np.arange(1 << num_treats).reshape(-1, 1, 1)
+    nxt = env.next_cell[None, :, :]
+    out = env.outcome[None, :, :].astype(np.int64)
+    bit = np.maximum(env.treat_index[env.next_cell], 0)[None, :, :]
+
+    # A TREAT move only scores while that treat is still in the mask
+    eats = (out == TREAT) & (((masks >> bit) & 1) == 1)
+    new_mask = np.where(eats, masks & ~(1 << bit), masks)
+    tile = np.where((out == TREAT) & ~eats, EMPTY, out)
+    tile = np.where(eats & (new_mask == 0), FINISHED, tile)
+
+    rewards = np.array([REWARDS[t] for t in TILES], dtype=np.float64)
+    terminal = np.array([t in TERMINAL_TILES for t in TILES], dtype=bool)
+    return {
+        "next": new_mask * num_states + nxt,
+        "reward": rewards[tile],
+        "done": terminal[tile],
+        "num_treats": num_treats,
+    }
+
+
+def value_iteration(env, gamma=0.9, tol=1e-6, max_iters=10000, model=None):
+    """
+    Solve the current level exactly with vectorized value iteration.
+
+    Args:
+        env (GridWorldEnv): env already reset to the level to solve.
+        gamma (float): discount factor, as in QAgent.
+        tol (float): stop once the largest Q change is below this.
+        max_iters (int): hard cap on sweeps.
+        model (dict | None): result of build_model(env), if already built.
+
+    Returns:
+        Q (np.ndarray): optimal action values shaped (num_masks, num_cells, num_actions),
+                        where mask bit i is set while treat i is uneaten.
+    """
+    if model is None:
+        model = build_model(env)
+    nxt, reward = model["next"], model["reward"]
+    discount = gamma * ~model["done"]  # no future value after a terminal move
+    # Q laid out action-major so the max over actions is an elementwise maximum
+    # of contiguous blocks (much faster than reducing a length-4 last axis)
+    nxt_a = np.ascontiguousarray(nxt.transpose(2, 0, 1))
+    reward_a = np.ascontiguousarray(reward.transpose(2, 0, 1))
+    discount_a = np.ascontiguousarray(discount.transpose(2, 0, 1))
+    Q_a = np.zeros(reward_a.shape)
+    for _ in range(max_iters):
+        V = np.maximum.reduce(Q_a).ravel()
+        new_Q = reward_a + discount_a * V.take(nxt_a)
+        delta = np.abs(new_Q - Q_a).max()
+        Q_a = new_Q
+        if delta < tol:
+            break
+    return Q_a.transpose(1, 2, 0).copy()
+
+
+def plan_q_table(env, gamma=0.9, tol=1e-6):
+    """
+    Build a QAgent-compatible table (num_states, num_actions) for the current level.
+
+    QAgent's state is only the pet cell, so the optimal (mask, cell) values are
+    projected onto cells: every cell on the optimal route from the start takes
+    the values of the mask it is first visited with; all other cells use the
+    values with every treat still on the map.
+
+    Routes that pass the same cell twice with different treats left (levels 2
+    and 4) cannot be followed exactly by a cell-only greedy policy; use
+    value_iteration() for the exact (mask, state) values in that case.
+
+    On an env with state_encoding="cell_treats" those exact values are returned
+    directly, flattened so row (mask, cell state) matches env.get_state().
+    Either way rows follow the env's cell state numbering (env.cell_of_state).
+    """
+    model = build_model(env)
+    Q_full = value_iteration(env, gamma=gamma, tol=tol, model=model)
+    num_masks, num_cells, num_actions = Q_full.shape
+    if env.state_encoding == "cell_treats":
+        return Q_full[:, env.cell_of_state].reshape(-1, num_actions)
+    full_mask = num_masks - 1
+
+    Q = Q_full[full_mask].copy()
+    seen = set()
+    row, col = env.pet_pos
+    idx = full_mask * num_cells + row * env.level.shape[1] + col
+    for _ in range(num_masks * num_cells):
+        mask, cell = divmod(idx, num_cells)
+        if cell not in seen:
+            Q[cell] = Q_full[mask, cell]
+            seen.add(cell)
+        a = int(np.argmax(Q_full[mask, cell]))
+        if model["done"][mask, cell, a]:
+            break
+        idx = int(model["next"][mask, cell, a])
+    return Q[env.cell_of_state]
+
+
+def plan_level_files(level_files, gamma=0.9, out_pattern="q_table_level{level}.npy", archive=None,
+                     state_encoding="cell"):
+    """
+    Plan every level and save one Q-table per level; returns the list of paths written.
+    archive = ModelArchive directory to also store the tables in (None = loose files only)
+    state_encoding = state encoding the tables are indexed by (see GridWorldEnv)
+    """
+    env = GridWorldEnv(level_files=level_files, headless=True, persistence="off",
+                       state_encoding=state_encoding)
+    store = ModelArchive(archive) if archive else None
+    paths = []
+    for level in range(len(level_files)):
+        env.reset(level)
+        Q = plan_q_table(env, gamma=gamma)
+        path = out_pattern.format(level=level)
+        np.save(path, Q)
+        if store is not None:
+            store.add(level, Q, level_files[level],
+                      hyperparams={"method": "value_iteration", "gamma": gamma},
+                      state_encoding=state_encoding)
+        paths.append(path)
+        print(f"Planned level {level}: Q-table {Q.shape} saved to {path}")
+    return paths
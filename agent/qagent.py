@@ -1,6 +1,9 @@
 import numpy as np
 import random
 from env.gridworld_env import GridWorldEnv
+from agent.replay import ReplayBuffer
+from agent.sparse_q import SparseQTable
+from agent.rng import RandomBlocks
 
 class QAgent:
     """
@@ -23,12 +26,14 @@ class QAgent:
         5. Repeat for many episodes
     """
     def __init__(self, num_states, num_actions, alpha=0.1, gamma=0.95, #initial alpha=0.1, gamma=0.95 #eps_decay_episodes=800
-                 eps_start=1.0, eps_end=0.05, eps_decay_episodes=500, env=None):
+                 eps_start=1.0, eps_end=0.05, eps_decay_episodes=500, env=None,
+                 replay_capacity=0, batch_size=32, sparse=False, dtype=np.float64, seed=None):
         """
         Initialize the agent and its learning parameters.
 
         Args:
-            num_states (int): total number of possible states in the environment, (rows * columns).
+            num_states (int): total number of possible states in the environment (env.num_states:
+                              walkable cells with the default compact numbering).
             num_actions (int): number of possible actions (e.g., 4 for UP/DOWN/LEFT/RIGHT).
             alpha (float): learning rate — how much new information overrides old.
                            Range [0,1]. Smaller = slower learning.
@@ -40,6 +45,15 @@ class QAgent:
                              The lowest probability of random exploration.
             eps_decay_episodes (int): number of episodes to decay epsilon from start → end.
             env (GridWorldEnv): optional reference to environment (used for debugging/printing).
+            replay_capacity (int): if > 0, keep this many past transitions in a ReplayBuffer
+                                   and replay a minibatch of them after every real update.
+            batch_size (int): transitions per replayed minibatch.
+            sparse (bool): store Q in a SparseQTable that only allocates visited states,
+                           for huge encodings such as state_encoding="cell_treats".
+            dtype: Q-table dtype; np.float32 halves the table's memory.
+            seed (int | None): seed of the agent's own random streams (exploration, replay
+                               sampling, Dyna planning), e.g. from agent.rng.make_seed.
+                               None draws one from `random`, so random.seed() still fixes a run.
         """
         #environmental dimensions
         self.num_states = num_states #total states in grid
@@ -57,9 +71,31 @@ class QAgent:
 
         #initialize the Q-table with zeros
         #each entry Q[s,a] represents the estimated value of taking action a in state s
-        self.Q = np.ones((num_states, num_actions))
+        self.sparse = sparse
+        if sparse:
+            self.Q = SparseQTable(num_states, num_actions, initial_value=1.0, dtype=dtype)
+        else:
+            self.Q = np.ones((num_states, num_actions), dtype=dtype)
         self.env = env
 
+        #independent child seeds for every random stream the agent (or a subclass) owns
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed_seq = np.random.SeedSequence(seed)
+        self.explore = RandomBlocks(num_actions, seed=self.seed_seq.spawn(1)[0])
+
+        #optional experience replay
+        self.batch_size = batch_size
+        self.replay = None
+        if replay_capacity > 0:
+            self.replay = ReplayBuffer(replay_capacity, seed=self.seed_seq.spawn(1)[0])
+
+    def begin_episode(self):
+        """
+        Called by the training loops right after env.reset(). Plain Q-learning keeps
+        nothing per episode; agents with eligibility traces (agent/traces.py) clear them here.
+        """
+
     def select_action(self, state):
         """
         Choose an action for the current state using the epsilon-greedy policy.
@@ -68,15 +104,16 @@ class QAgent:
         - With probability (1 - ε), choose the action with the highest Q-value (exploitation).
 
         Args:
-            state (int): the current encoded state (row * cols + col).
+            state (int): the current encoded state (env.get_state()).
 
         Returns:
             action (int): index of the chosen action.
         """
-        # Generate a random number between 0 and 1
+        # Take the next pre-drawn number between 0 and 1 (and random action)
         # If it's less than epsilon → explore (random action)
-        if random.random() < self.epsilon:
-            return random.randint(0, self.num_actions - 1)
+        u, random_action = self.explore.next()
+        if u < self.epsilon:
+            return random_action
         else:
             # Otherwise exploit: pick the action with the maximum Q-value for this state
             return int(np.argmax(self.Q[state]))
@@ -113,6 +150,68 @@ class QAgent:
         # 4. Update Q-value with learning rate α
         self.Q[state, action] += self.alpha * td_error
 
+        # 5. Replay mode: remember the transition and learn from a minibatch of old ones
+        if self.replay is not None:
+            self.replay.add(state, action, reward, next_state, done)
+            if len(self.replay) >= self.batch_size:
+                self.update_batch(*self.replay.sample(self.batch_size))
+
+    def update_batch(self, states, actions, rewards, next_states, dones):
+        """
+        Apply the update() rule to a whole batch of transitions at once.
+
+        All TD errors are computed from the Q-table as it was before the batch.
+        A (state, action) pair that appears k times in the batch gets the mean
+        of its k updates, so duplicates don't push it k times as far.
+
+        Args:
+            states, actions, next_states (np.ndarray): int arrays of equal length.
+            rewards (np.ndarray): float array.
+            dones (np.ndarray): bool array; no future value after a terminal move.
+        """
+        # Terminal moves have no future value (their next state may even be on the next level)
+        next_states = np.where(dones, states, next_states)
+        max_next = np.where(dones, 0.0, self.Q[next_states].max(axis=1))
+        td_error = rewards + self.gamma * max_next - self.Q[states, actions]
+
+        # Scatter-add so repeated (s, a) pairs accumulate instead of overwriting
+        _, inverse, counts = np.unique(states * self.num_actions + actions,
+                                       return_inverse=True, return_counts=True)
+        deltas = self.alpha * td_error / counts[inverse]
+        if self.sparse:
+            self.Q.add_at(states, actions, deltas)
+        else:
+            np.add.at(self.Q, (states, actions), deltas)
+
+    def checkpoint_state(self):
+        """
+        Return (arrays, meta): the Q-table (plus replay buffer) as arrays and the
+        scalar learning state as JSON-friendly values. Used by agent/checkpoint.py.
+        """
+        arrays = self.Q.checkpoint_state() if self.sparse else {"Q": self.Q}
+        meta = {"epsilon": self.epsilon, "explore": self.explore.checkpoint_state(), "replay": None}
+        if self.replay is not None:
+            replay_arrays, meta["replay"] = self.replay.checkpoint_state()
+            arrays.update(replay_arrays)
+        return arrays, meta
+
+    def restore_checkpoint_state(self, arrays, meta):
+        """Inverse of checkpoint_state(); the agent must be built with the same sizes."""
+        if self.sparse != ("Q_states" in arrays):
+            raise ValueError("checkpoint and agent disagree on whether the Q-table is sparse")
+        if self.sparse:
+            self.Q.restore_checkpoint_state(arrays)
+        elif arrays["Q"].shape != self.Q.shape:
+            raise ValueError(f"checkpoint Q-table shape {arrays['Q'].shape} != {self.Q.shape}")
+        else:
+            self.Q = np.array(arrays["Q"], dtype=self.Q.dtype)
+        self.epsilon = meta["epsilon"]
+        self.explore.restore_checkpoint_state(meta["explore"])
+        if (self.replay is None) != (meta["replay"] is None):
+            raise ValueError("checkpoint and agent disagree on whether experience replay is on")
+        if self.replay is not None:
+            self.replay.restore_checkpoint_state(arrays, meta["replay"])
+
     def decay_epsilon(self, episode):
         """
         Linearly decay epsilon from eps_start → eps_end across
@@ -142,7 +241,9 @@ class QAgent:
         cols = len(self.env.grid[0])
         for r in range(rows):
             for c in range(cols):
-                state = r * cols + c
+                state = self.env.state_at(r, c)
+                if state is None:
+                    continue  # walls have no state
                 # Print each state's action values (one row per grid cell)
                 print(f"({r},{c}): {self.Q[state]}")
             print() # blank line between rows
\ No newline at end of file
@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    Fixed-capacity ring buffer of transitions held in preallocated NumPy arrays:
+        states       (capacity,) int    state before the action
+        actions      (capacity,) int    action taken
+        rewards      (capacity,) float  reward received
+        next_states  (capacity,) int    state after the action
+        dones        (capacity,) bool   True if the move ended the episode
+
+    Once full, each new transition overwrites the oldest one.
+    """
+
+    def __init__(self, capacity, seed=None):
+        """
+        Args:
+            capacity (int): maximum number of transitions kept.
+            seed (int | None): seed for the minibatch sampler.
+        """
+        if capacity < 1:
+            raise ValueError(f"replay capacity must be >= 1, got {capacity}")
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float64)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.size = 0
+        self._next = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        """Store one transition, overwriting the oldest once the buffer is full."""
+        i = self._next
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self._next = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size):
+        """
+        Draw batch_size stored transitions uniformly at random (with replacement).
+
+        Returns:
+            (states, actions, rewards, next_states, dones) arrays of length batch_size.
+        """
+        idx = self.rng.integers(self.size, size=batch_size)
+        return (self.states[idx], self.actions[idx], self.rewards[idx],
+                self.next_states[idx], self.dones[idx])
+
+    def checkpoint_state(self):
+        """(arrays, meta) holding everything needed to continue sampling exactly; see agent/checkpoint.py."""
+        arrays = {
+            "replay_states": self.states,
+            "replay_actions": self.actions,
+            "replay_rewards": self.rewards,
+            "replay_next_states": self.next_states,
+            "replay_dones": self.dones,
+        }
+        meta = {"size": self.size, "next": self._next, "rng": self.rng.bit_generator.state}
+        return arrays, meta
+
+    def restore_checkpoint_state(self, arrays, meta):
+        if len(arrays["replay_states"]) != self.capacity:
+            raise ValueError(f"checkpoint replay capacity {len(arrays['replay_states'])} != {self.capacity}")
+        self.states[:] = arrays["replay_states"]
+        self.actions[:] = arrays["replay_actions"]
+        self.rewards[:] = arrays["replay_rewards"]
+        self.next_states[:] = arrays["replay_next_states"]
+        self.dones[:] = arrays["replay_dones"]
+        self.size = meta["size"]
+        self._next = meta["next"]
+        self.rng.bit_generator.state = meta["rng"]
@@ -0,0 +1,73 @@
+"""
+Per-agent random numbers.
+
+Every agent owns its own numpy Generator instead of sharing Python's global
+`random` module, so a run is reproducible from one seed and parallel workers
+never touch each other's streams. make_seed() derives the seed of one
+(run, level, worker, ...) combination from the run seed.
+"""
+import numpy as np
+
+# Exploration draws made per refill of RandomBlocks
+BLOCK_SIZE = 4096
+
+
+def make_seed(run_seed, *keys):
+    """
+    Deterministic seed for one part of a run, e.g. make_seed(seed, level) or
+    make_seed(seed, config, level, repeat). Different keys give independent
+    streams (via numpy's SeedSequence). Returns None when run_seed is None.
+    """
+    if run_seed is None:
+        return None
+    return int(np.random.SeedSequence([run_seed, *keys]).generate_state(1)[0])
+
+
+class RandomBlocks:
+    """
+    Epsilon-greedy randomness drawn from a Generator in blocks:
+        uniforms  (block_size,) float  compared with epsilon
+        actions   (block_size,) int    the random action, used when exploring
+
+    select_action takes one (uniform, action) pair per call with a cursor and the
+    next block is drawn once it runs out, so the per-step cost is two list
+    lookups instead of one or two Python-level RNG calls.
+    """
+
+    def __init__(self, num_actions, seed=None, block_size=BLOCK_SIZE):
+        """
+        Args:
+            num_actions (int): random actions are drawn from range(num_actions).
+            seed (int | np.random.SeedSequence | None): Generator seed.
+            block_size (int): pairs drawn per refill.
+        """
+        self.num_actions = num_actions
+        self.block_size = block_size
+        self.rng = np.random.default_rng(seed)
+        self._refill()
+
+    def _refill(self):
+        # Generator state before the block, so a checkpoint can redraw it exactly
+        self._block_state = self.rng.bit_generator.state
+        self._uniforms = self.rng.random(self.block_size).tolist()
+        self._actions = self.rng.integers(self.num_actions, size=self.block_size).tolist()
+        self._cursor = 0
+
+    def next(self):
+        """Return the next (uniform in [0, 1), random action) pair."""
+        i = self._cursor
+        if i == self.block_size:
+            self._refill()
+            i = 0
+        self._cursor = i + 1
+        return self._uniforms[i], self._actions[i]
+
+    def checkpoint_state(self):
+        """JSON-friendly state: the Generator state the current block was drawn from plus the cursor."""
+        return {"block_rng": self._block_state, "cursor": self._cursor, "block_size": self.block_size}
+
+    def restore_checkpoint_state(self, meta):
+        self.block_size = meta["block_size"]
+        self.rng.bit_generator.state = meta["block_rng"]
+        self._refill()
+        self._cursor = meta["cursor"]
@@ -0,0 +1,158 @@
+import numpy as np
+
+
+class SparseQTable:
+    """
+    Q-table that only allocates rows for states that have been written to.
+
+    Meant for state encodings whose theoretical size is far larger than what an
+    agent ever visits, e.g. GridWorldEnv(state_encoding="cell_treats"), where
+    num_states is cells * 2**treats. Rows live contiguously in one NumPy array
+    and a dict maps each stored state to its row:
+        values  (capacity + 1, num_actions) float  row 0 = initial_value for every
+                                                   unseen state, rows 1.. = stored states
+        _rows   {state: row}
+
+    Indexing follows the dense table QAgent uses:
+        Q[s]             action values of state s (unseen states read row 0)
+        Q[s, a]          one value; Q[s, a] = v stores s if needed
+        Q[states]        (n, num_actions) for an int array of states
+        Q[states, acts]  (n,) values
+    Writes must go through Q[...] = v or add_at(); a row returned by Q[s] is a
+    view that may be the shared default row or move when the table grows.
+    The full dense table is only built by an explicit to_dense() call; saving
+    (agent.checkpoint.save_q_table) keeps the stored rows only.
+    """
+
+    def __init__(self, num_states, num_actions, initial_value=1.0, capacity=256, dtype=np.float64):
+        """
+        Args:
+            num_states (int): size of the state space the ids come from (only used
+                              for shape and to_dense(); nothing of that size is allocated).
+            num_actions (int): actions per state.
+            initial_value (float): value of every (state, action) not written yet.
+            capacity (int): rows allocated up front; doubled whenever it runs out.
+            dtype: dtype of the values.
+        """
+        self.num_states = num_states
+        self.num_actions = num_actions
+        self.initial_value = initial_value
+        self.values = np.full((capacity + 1, num_actions), initial_value, dtype=dtype)
+        self._rows = {}
+        self._size = 1  # next free row
+
+    @property
+    def shape(self):
+        return (self.num_states, self.num_actions)
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    def __len__(self):
+        """Number of states stored."""
+        return len(self._rows)
+
+    def __contains__(self, state):
+        return int(state) in self._rows
+
+    # ----------------------------
+    # Row lookup
+    # ----------------------------
+    def _row(self, state):
+        """Row of state, allocating one (set to initial_value) if it has none yet."""
+        row = self._rows.get(state)
+        if row is None:
+            if self._size == len(self.values):
+                self._grow()
+            row = self._size
+            self._rows[state] = row
+            self._size += 1
+        return row
+
+    def _grow(self):
+        values = np.full((2 * len(self.values), self.num_actions), self.initial_value, dtype=self.dtype)
+        values[:len(self.values)] = self.values
+        self.values = values
+
+    def rows(self, states, allocate=False):
+        """
+        Row index for each state (scalar or int array). Unseen states map to the
+        default row 0, or get a row of their own with allocate=True.
+        """
+        if np.ndim(states) == 0:
+            state = int(states)
+            return self._row(state) if allocate else self._rows.get(state, 0)
+        states = np.asarray(states)
+        if allocate:
+            rows = [self._row(s) for s in states.ravel().tolist()]
+        else:
+            get = self._rows.get
+            rows = [get(s, 0) for s in states.ravel().tolist()]
+        return np.array(rows, dtype=np.int64).reshape(states.shape)
+
+    def states(self):
+        """Stored states as an int array, in row order."""
+        return np.fromiter(self._rows, dtype=np.int64, count=len(self._rows))
+
+    # ----------------------------
+    # Array-style access
+    # ----------------------------
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            states, actions = key
+            return self.values[self.rows(states), actions]
+        return self.values[self.rows(key)]
+
+    # Rows are looked up before self.values is read: allocating may replace the array
+    def __setitem__(self, key, value):
+        if isinstance(key, tuple):
+            states, actions = key
+            rows = self.rows(states, allocate=True)
+            self.values[rows, actions] = value
+        else:
+            rows = self.rows(key, allocate=True)
+            self.values[rows] = value
+
+    def add_at(self, states, actions, deltas):
+        """np.add.at(Q, (states, actions), deltas): repeated pairs all accumulate."""
+        rows = self.rows(states, allocate=True)
+        np.add.at(self.values, (rows, actions), deltas)
+
+    def to_dense(self, dtype=None):
+        """The full (num_states, num_actions) table; unseen states hold initial_value."""
+        dense = np.full(self.shape, self.initial_value, dtype=dtype or self.dtype)
+        dense[self.states()] = self.values[1:self._size]
+        return dense
+
+    def __array__(self, dtype=None, copy=None):
+        # Expanding to the full state space is what this class exists to avoid, so
+        # np.asarray / np.save must not do it behind the caller's back
+        raise TypeError("SparseQTable is not converted to an array implicitly; "
+                        "call to_dense() or save it with agent.checkpoint.save_q_table")
+
+    @property
+    def nbytes(self):
+        """Bytes used by the value rows allocated so far."""
+        return self.values.nbytes
+
+    # ----------------------------
+    # Checkpoints
+    # ----------------------------
+    def checkpoint_state(self):
+        """Arrays holding every stored row; see agent/checkpoint.py."""
+        return {"Q_states": self.states(), "Q_values": self.values[1:self._size]}
+
+    def restore_checkpoint_state(self, arrays):
+        states, values = arrays["Q_states"], arrays["Q_values"]
+        if values.ndim != 2 or values.shape[1] != self.num_actions:
+            raise ValueError(f"checkpoint Q rows have shape {values.shape}, need (n, {self.num_actions})")
+        capacity = max(len(self.values) - 1, len(states))
+        self.values = np.full((capacity + 1, self.num_actions), self.initial_value, dtype=self.dtype)
+        self.values[1:len(states) + 1] = values
+        self._rows = {int(s): i + 1 for i, s in enumerate(states.tolist())}
+        self._size = len(states) + 1
@@ -0,0 +1,187 @@
+import numpy as np
+from agent.qagent import QAgent
+
+# Sparse traces below this are dropped (gamma * lam shrinks them every step)
+TRACE_MIN = 1e-3
+
+
+class QLambdaAgent(QAgent):
+    """
+    Watkins's Q(lambda): Q-learning with eligibility traces.
+
+    Every (state, action) pair keeps a trace of how recently it was taken. A TD
+    error then updates every traced pair at once, Q += alpha * delta * E, so a
+    treat's reward reaches the start of a long corridor in one episode instead
+    of creeping back one cell per episode. Traces decay by gamma * lam per step
+    and are cut whenever the agent takes an exploratory (non-greedy) action,
+    since the steps before it no longer follow the greedy policy being learned.
+
+    Traces are stored either as
+        dense   E (num_states, num_actions) float  same shape as Q; every step is
+                                                    one whole-table NumPy operation
+        sparse  trace_pairs (k,) int  flat s * num_actions + a of the traced pairs
+                trace_values (k,) float  their traces; pairs below TRACE_MIN are
+                                         dropped, so k stays a few dozen
+    Sparse traces are required with a sparse Q-table.
+
+    The next action is chosen inside update() (the target needs it), then handed
+    out by the following select_action() call for that state, so the usual
+    select_action / step / update loop works unchanged. Training loops call
+    begin_episode() so traces never leak from one episode into the next.
+    """
+
+    def __init__(self, num_states, num_actions, lam=0.9, sparse_traces=False, replacing=True, **kwargs):
+        """
+        Args:
+            num_states, num_actions, **kwargs: as for QAgent (no experience replay).
+            lam (float): trace decay lambda in [0, 1]; 0 is one-step Q-learning.
+            sparse_traces (bool): keep only non-negligible traces instead of a full E table.
+            replacing (bool): a revisited pair's trace is reset to 1 (True) or incremented (False).
+        """
+        super().__init__(num_states, num_actions, **kwargs)
+        if self.replay is not None:
+            raise ValueError(f"{type(self).__name__} does not combine with experience replay")
+        if self.sparse and not sparse_traces:
+            raise ValueError("a sparse Q-table needs sparse_traces=True")
+        self.lam = lam
+        self.sparse_traces = sparse_traces
+        self.replacing = replacing
+        if sparse_traces:
+            self.trace_pairs = np.zeros(0, dtype=np.int64)
+            self.trace_values = np.zeros(0, dtype=np.float64)
+        else:
+            self.E = np.zeros((num_states, num_actions), dtype=self.Q.dtype)
+        self._pending = None  # (state, action) chosen by the last update
+
+    # ----------------------------
+    # Acting
+    # ----------------------------
+    def begin_episode(self):
+        self.clear_traces()
+        self._pending = None
+
+    def select_action(self, state):
+        """The action update() already chose for this state, else epsilon-greedy as QAgent."""
+        pending, self._pending = self._pending, None
+        if pending is not None and pending[0] == state:
+            return pending[1]
+        return super().select_action(state)
+
+    # ----------------------------
+    # Learning
+    # ----------------------------
+    def update(self, state, action, reward, next_state, done):
+        """
+        One TD step for the whole table:
+            delta = r + gamma * Q(s', a*) - Q(s, a)    (a* greedy; SARSA uses a')
+            E(s, a) = 1, Q += alpha * delta * E, then E *= gamma * lam
+        """
+        keep_traces = False
+        target = reward
+        if not done:
+            next_action = super().select_action(next_state)
+            self._pending = (next_state, next_action)
+            next_q = self.Q[next_state]
+            target += self.gamma * self._next_value(next_q, next_action)
+            keep_traces = self._keeps_traces(next_q, next_action)
+
+        delta = target - self.Q[state, action]
+        self._mark(state, action)
+        self._apply(self.alpha * delta)
+        if keep_traces:
+            self._decay(self.gamma * self.lam)
+        else:
+            self.clear_traces()
+
+    def _next_value(self, next_q, next_action):
+        return next_q.max()
+
+    def _keeps_traces(self, next_q, next_action):
+        # Watkins: an exploratory next action ends the greedy trajectory
+        return next_q[next_action] == next_q.max()
+
+    # ----------------------------
+    # Traces
+    # ----------------------------
+    def clear_traces(self):
+        if self.sparse_traces:
+            self.trace_pairs = self.trace_pairs[:0]
+            self.trace_values = self.trace_values[:0]
+        else:
+            self.E.fill(0.0)
+
+    def _mark(self, state, action):
+        if not self.sparse_traces:
+            if self.replacing:
+                self.E[state, action] = 1.0
+            else:
+                self.E[state, action] += 1.0
+            return
+        pair = state * self.num_actions + action
+        hit = np.flatnonzero(self.trace_pairs == pair)
+        if hit.size:
+            self.trace_values[hit] = 1.0 if self.replacing else self.trace_values[hit] + 1.0
+        else:
+            self.trace_pairs = np.append(self.trace_pairs, pair)
+            self.trace_values = np.append(self.trace_values, 1.0)
+
+    def _apply(self, step):
+        """Q += step * E over every traced pair at once."""
+        if not self.sparse_traces:
+            self.Q += step * self.E
+            return
+        states, actions = np.divmod(self.trace_pairs, self.num_actions)
+        if self.sparse:
+            self.Q.add_at(states, actions, step * self.trace_values)
+        else:
+            self.Q[states, actions] += step * self.trace_values  # pairs are unique
+
+    def _decay(self, factor):
+        if not self.sparse_traces:
+            self.E *= factor
+            return
+        self.trace_values *= factor
+        live = self.trace_values >= TRACE_MIN
+        if not live.all():
+            self.trace_pairs = self.trace_pairs[live]
+            self.trace_values = self.trace_values[live]
+
+    # ----------------------------
+    # Checkpoints
+    # ----------------------------
+    def checkpoint_state(self):
+        arrays, meta = super().checkpoint_state()
+        if self.sparse_traces:
+            arrays.update(trace_pairs=self.trace_pairs, trace_values=self.trace_values)
+        else:
+            arrays["E"] = self.E
+        meta["traces"] = {"lam": self.lam, "sparse": self.sparse_traces,
+                          "pending": list(self._pending) if self._pending else None}
+        return arrays, meta
+
+    def restore_checkpoint_state(self, arrays, meta):
+        super().restore_checkpoint_state(arrays, meta)
+        traces = meta.get("traces")
+        if traces is None or traces["sparse"] != self.sparse_traces:
+            raise ValueError(f"checkpoint does not hold {type(self).__name__} traces of the same kind")
+        if self.sparse_traces:
+            self.trace_pairs = np.array(arrays["trace_pairs"], dtype=np.int64)
+            self.trace_values = np.array(arrays["trace_values"], dtype=np.float64)
+        else:
+            self.E[:] = arrays["E"]
+        self._pending = tuple(traces["pending"]) if traces["pending"] else None
+
+
+class SarsaLambdaAgent(QLambdaAgent):
+    """
+    SARSA(lambda): the same traces, but on-policy. The target uses the action
+    actually chosen next, Q(s', a'), and exploratory actions do not cut the
+    traces, so the agent learns the value of the epsilon-greedy policy it follows
+    (it steers wider around traps while still exploring).
+    """
+
+    def _next_value(self, next_q, next_action):
+        return next_q[next_action]
+
+    def _keeps_traces(self, next_q, next_action):
+        return True
@@ -0,0 +1,325 @@
+"""
+Throughput benchmarks for the env, agent and renderer hot paths.
+
+Measures GridWorldEnv.reset, step per outcome type, QAgent.select_action /
+update, the pygame draw calls and whole training episodes per level, and
+saves the numbers as JSON so two commits can be compared.
+
+Runs on a headless box: SDL's dummy video and audio drivers are used unless
+SDL_VIDEODRIVER / SDL_AUDIODRIVER are already set.
+
+Examples:
+    python benchmark.py
+    python benchmark.py --levels 0 3 --skip-render --out bench_before.json
+    python benchmark.py --compare bench_before.json
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import contextlib
+import subprocess
+import numpy as np
+
+from env.gridworld_env import GridWorldEnv, EMPTY, WALL, TREAT, TRAP
+from agent.qagent import QAgent
+from train import LEVEL_FILES, make_headless_env
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the env's console output so terminal I/O doesn't swamp the timings."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def time_calls(fn, number, setup=None):
+    """
+    Mean nanoseconds per fn() call over number calls.
+    With setup, setup() runs before every call and is left out of the timing.
+    """
+    if setup is None:
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        return (time.perf_counter_ns() - start) / number
+
+    total = 0
+    for _ in range(number):
+        setup()
+        start = time.perf_counter_ns()
+        fn()
+        total += time.perf_counter_ns() - start
+    return total / number
+
+
+def rate(ns_per_call):
+    """Calls per second for a mean call time in nanoseconds."""
+    return 1e9 / ns_per_call if ns_per_call else float("inf")
+
+
+def result(ns_per_call, unit):
+    return {"ns_per_call": ns_per_call, f"{unit}_per_sec": rate(ns_per_call)}
+
+
+# ----------------------------
+# Environment
+# ----------------------------
+def bench_reset(env, level, number):
+    env.reset(level)  # first reset parses the level; time the steady state
+    return result(time_calls(lambda: env.reset(level), number), "resets")
+
+
+def _find_move(env, code):
+    """First (cell, action) whose precomputed outcome is code, or None."""
+    cells, actions = np.nonzero(env.outcome == code)
+    if len(cells) == 0:
+        return None
+    return int(cells[0]), int(actions[0])
+
+
+def bench_step_outcomes(env, level, number):
+    """
+    Time step() separately for each outcome type; the env is put back in place between calls.
+
+    Eating the last treat makes a multi-level env reset to the next level, so the
+    "finished" move is timed on an env holding only this level (as VecGridWorldEnv
+    does): it measures the step itself, not the next level's restore.
+    """
+    env.reset(level)
+    solo = make_headless_env(level_files=[env.level_files[level]])
+    solo.reset(0)
+    num_treats = len(env.level.treats)
+    cols = env._cols
+
+    moves = {
+        "empty": _find_move(env, EMPTY),
+        "wall": _find_move(env, WALL),
+        "trap": _find_move(env, TRAP),
+        # A treat that isn't the last one left, and the last one (which finishes the level)
+        "treat": _find_move(env, TREAT) if num_treats > 1 else None,
+        "finished": _find_move(env, TREAT),
+    }
+
+    results = {}
+    for tile, move in moves.items():
+        if move is None:
+            continue  # this level has no such move
+        cell, a = move
+        target, target_level = (solo, 0) if tile == "finished" else (env, level)
+        snapshot = target._level_snapshots[target_level]
+
+        def setup(target=target, target_level=target_level, snapshot=snapshot, cell=cell, a=a, tile=tile):
+            target.current_level = target_level
+            target._restore_snapshot(snapshot)
+            target.pet_pos = list(divmod(cell, cols))
+            if tile == "finished":
+                # Leave only the treat this move eats
+                keep = int(target.treat_index[target.next_cell[cell, a]])
+                for i, (r, c) in enumerate(target.level.treats):
+                    if i != keep:
+                        target.objects.pop((int(r), int(c)), None)
+                target.treat_mask = 1 << keep
+                target.remaining_treats = 1
+
+        res = result(time_calls(lambda target=target, a=a: target.step(a), number, setup=setup), "steps")
+        results[tile] = res
+    env.reset(level)
+    return results
+
+
+def bench_episodes(level, episodes, max_steps=500, seed=0):
+    """Full epsilon-greedy training episodes (select_action + step + update) on one level."""
+    random.seed(seed)
+    env = make_headless_env()
+    env.reset(level)
+    agent = QAgent(env.num_states, env.num_actions, alpha=0.9, gamma=0.9,
+                   eps_start=1.0, eps_end=0.05, eps_decay_episodes=max(episodes // 2, 1), seed=seed)
+
+    total_steps = 0
+    start = time.perf_counter_ns()
+    for ep in range(episodes):
+        env.reset(level)
+        s = env.get_state()
+        done, steps = False, 0
+        while not done and steps < max_steps:
+            a = agent.select_action(s)
+            s2, r, done, _ = env.step(a)
+            agent.update(s, a, r, s2, done)
+            s = s2
+            steps += 1
+        agent.decay_epsilon(ep + 1)
+        total_steps += steps
+    elapsed = (time.perf_counter_ns() - start) / 1e9
+    return {
+        "episodes": episodes,
+        "steps": total_steps,
+        "seconds": elapsed,
+        "steps_per_sec": total_steps / elapsed,
+        "episodes_per_sec": episodes / elapsed,
+    }
+
+
+# ----------------------------
+# Agent
+# ----------------------------
+def bench_agent(num_states, num_actions, number, seed=0):
+    random.seed(seed)
+    agent = QAgent(num_states, num_actions, alpha=0.9, gamma=0.9, seed=seed)
+    rng = np.random.default_rng(seed)
+    states = rng.integers(num_states, size=number).tolist()
+    actions = rng.integers(num_actions, size=number).tolist()
+
+    results = {}
+    for name, epsilon in (("select_action_explore", 1.0), ("select_action_greedy", 0.0)):
+        agent.epsilon = epsilon
+        it = iter(states)
+        results[name] = result(time_calls(lambda: agent.select_action(next(it)), number), "calls")
+
+    it = iter(zip(states, actions, states[1:] + states[:1]))
+    def update():
+        s, a, s2 = next(it)
+        agent.update(s, a, -1.0, s2, False)
+    results["update"] = result(time_calls(update, number), "calls")
+    return results
+
+
+# ----------------------------
+# Renderer
+# ----------------------------
+def bench_render(level, number, seed=0):
+    """Time the draw calls on an offscreen display at the env's default tile size."""
+    import pygame
+    random.seed(seed)
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    env = GridWorldEnv(level_files=LEVEL_FILES, asset_dir="assets", persistence="off")
+    env.reset(level)
+    screen = pygame.display.set_mode(env.get_window_size())
+
+    hud = dict(mode="EXPLORE", episode=1, total_reward=-12, epsilon=0.5)
+    results = {
+        "render_pygame": result(time_calls(lambda: env.render_pygame(screen), number), "frames"),
+        "render_ui": result(time_calls(lambda: env.render_ui(screen), number), "frames"),
+        "render_hud": result(time_calls(lambda: env.render_hud(screen, **hud), number), "frames"),
+    }
+
+    def full_frame():
+        screen.fill((0, 0, 0))
+        env.render_pygame(screen)
+        env.render_ui(screen)
+        env.render_hud(screen, **hud)
+        pygame.display.flip()
+    results["full_frame"] = result(time_calls(full_frame, number), "frames")
+
+    # Dirty frames follow a random walk so the pet and the HUD actually change
+    def move():
+        with quiet():
+            env.step(random.randrange(env.num_actions))
+        hud["total_reward"] -= 1
+    def dirty_frame():
+        pygame.display.update(env.render_frame(screen, **hud))
+    env.render_frame(screen, **hud)
+    results["dirty_frame"] = result(time_calls(dirty_frame, number, setup=move), "frames")
+
+    env.close()
+    pygame.quit()
+    return results
+
+
+# ----------------------------
+# Running and comparing
+# ----------------------------
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(levels, number=20000, episodes=200, render_number=300, skip_render=False):
+    results = {}
+    for level in levels:
+        print(f"Level {level}...")
+        with quiet():
+            env = make_headless_env()
+            res = {
+                "reset": bench_reset(env, level, number),
+                "step": bench_step_outcomes(env, level, number),
+                "agent": bench_agent(env.num_states, env.num_actions, number),
+                "episodes": bench_episodes(level, episodes),
+            }
+            if not skip_render:
+                res["render"] = bench_render(level, render_number)
+        results[str(level)] = res
+    return results
+
+
+def flatten(results, prefix=""):
+    """{"0": {"reset": {"resets_per_sec": x}}} -> {"0/reset/resets_per_sec": x}"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}/{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        else:
+            flat[name] = value
+    return flat
+
+
+def print_report(results, baseline=None):
+    """Print every per-second rate, with the speedup over baseline when given."""
+    flat = flatten(results)
+    base = flatten(baseline) if baseline else {}
+    for name, value in flat.items():
+        if not name.endswith("_per_sec"):
+            continue
+        line = f"{name:<52} {value:>14,.0f}"
+        if base.get(name):
+            line += f"   x{value / base[name]:.2f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the env, agent and renderer hot paths")
+    parser.add_argument("--levels", type=int, nargs="+", default=list(range(len(LEVEL_FILES))))
+    parser.add_argument("--number", type=int, default=20000, help="calls per micro-benchmark")
+    parser.add_argument("--episodes", type=int, default=200, help="training episodes per level")
+    parser.add_argument("--render-number", type=int, default=300, help="frames per render benchmark")
+    parser.add_argument("--skip-render", action="store_true", help="leave out the pygame benchmarks")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to show speedups against")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.levels, number=args.number, episodes=args.episodes,
+                             render_number=args.render_number, skip_render=args.skip_render)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_report(results, baseline)
+
+    meta = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "args": vars(args),
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=1)
+    print(f"Saved results to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,217 @@
 import os
 import glob
-import pygame
 import shutil
+import logging
+import threading
+import numpy as np
 from levels.levelAssets import Levels
+from env import level_compiler
+from env.level_compiler import compile_level
 
 # from q_table import QLearningAgent
 
+logger = logging.getLogger(__name__)
+
+# pygame is only imported once a renderer is attached (see attach_renderer),
+# so headless training never pays for SDL video/audio startup.
+pygame = None
+
 ACTIONS = ["UP", "DOWN", "LEFT", "RIGHT"]
+ACTION_INDEX = {a: i for i, a in enumerate(ACTIONS)}
+ACTION_DELTAS = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # (dr, dc) per entry of ACTIONS
+
+# Possible move outcomes (info["tile"]) and their rewards.
+# Shared by step() and VecGridWorldEnv so both environments score moves identically.
+TILES = ["empty", "wall", "treat", "trap", "finished"]
+REWARDS = {"empty": -1, "wall": -5, "treat": 15, "trap": -50, "finished": 15}
+TERMINAL_TILES = ("trap", "finished")
+
+# Integer codes for TILES, as stored in GridWorldEnv.outcome
+EMPTY, WALL, TREAT, TRAP, FINISHED = range(len(TILES))
+
+# Compiled tile code -> outcome of stepping onto that tile
+_TILE_OUTCOME = np.zeros(4, dtype=np.uint8)
+_TILE_OUTCOME[level_compiler.FLOOR] = EMPTY
+_TILE_OUTCOME[level_compiler.WALL] = WALL
+_TILE_OUTCOME[level_compiler.TREAT] = TREAT
+_TILE_OUTCOME[level_compiler.TRAP] = TRAP
+
+# Pet sprite file prefix per facing; frames "" and "2" alternate while walking
+PET_SPRITES = {
+    "UP": "siameseBack",
+    "DOWN": "siameseFront",
+    "LEFT": "siameseLeft",
+    "RIGHT": "siameseRight",
+}
+PET_FRAMES = ("", "2")
+
+# UI fonts: key -> (system font name, or None for pygame's default font, size)
+UI_FONTS = {"hud": ("Arial", 18), "counter": (None, 36), "complete": (None, 24)}
+# Rendered text surfaces kept before the cache is cleared (steps/reward values churn)
+TEXT_CACHE_SIZE = 512
+
+# How the temp level file follows the live grid (see GridWorldEnv.__init__)
+PERSISTENCE_MODES = ("sync", "episode", "background", "off")
+# What get_state() encodes (see GridWorldEnv.__init__)
+STATE_ENCODINGS = ("cell", "cell_treats")
+
+
+class _TempFileWriter:
+    """
+    Background thread that writes temp level files for persistence="background".
+    Only the newest content per file is kept, so bursts of treat pickups coalesce
+    into a single write and the step loop never waits on the disk.
+    """
+
+    def __init__(self):
+        self._pending = {}  # path -> text
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="temp-level-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, path, text):
+        with self._cond:
+            self._pending[path] = text
+            self._cond.notify()
+
+    def close(self):
+        """Write whatever is still pending and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+            for path, text in batch.items():
+                try:
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(text)
+                except Exception as e:
+                    logger.error("Error writing temp level file '%s': %s", path, e)
+
+
+def _import_pygame():
+    """Import pygame on first use and publish it as the module-level name."""
+    global pygame
+    if pygame is None:
+        import pygame as _pygame
+        pygame = _pygame
+    return pygame
 
 
 class GridWorldEnv:
     TILE_SIZE = 64
 
-    def __init__(self, level_files, asset_dir="assets"):
-        pygame.mixer.init()
+    def __init__(self, level_files, asset_dir="assets", headless=False, persistence="sync",
+                 state_encoding="cell", compact_states=True):
+        """
+        Args:
+            level_files (list[str]): paths of the level text files, in play order.
+            asset_dir (str): root folder for tiles, pets and sounds.
+            headless (bool): if True, run only the simulation core (reset/step/get_state)
+                             without importing pygame. Call attach_renderer() later if a
+                             visual mode needs sprites and sounds.
+            persistence (str): how the temp level file (levels/temp_levelN.txt) tracks
+                             eaten treats:
+                               "sync"       - rewrite it on every treat pickup (default)
+                               "episode"    - write the final grid once when an episode ends
+                               "background" - hand writes to a thread that coalesces them
+                               "off"        - pure in-memory, no temp file at all
+            state_encoding (str): what get_state() returns:
+                               "cell"        - the pet's cell state (default)
+                               "cell_treats" - cell state + cell states * treat_mask, so the
+                                               same cell with different treats left is a different
+                                               state; num_states grows by 2**treats, so pair
+                                               it with a sparse Q-table (QAgent(sparse=True))
+            compact_states (bool): number cell states over walkable cells only (see
+                             cell_of_state / state_of_cell), so Q-tables have no rows for
+                             walls; False numbers every cell as row * cols + col.
+        """
+        if persistence not in PERSISTENCE_MODES:
+            raise ValueError(f"persistence must be one of {PERSISTENCE_MODES}, got {persistence!r}")
+        if state_encoding not in STATE_ENCODINGS:
+            raise ValueError(f"state_encoding must be one of {STATE_ENCODINGS}, got {state_encoding!r}")
         self.level_files = level_files
         self.asset_dir = asset_dir
+        self.headless = True
         self.current_level = 0
         self.grid = None
+        self.level = None  # CompiledLevel of the current level
         self.pet_pos = None
         self.pet_surface = None
+        self.pet_facing = "DOWN"
+        self.pet_frame = ""
+        self.pet_sprites = {}
+        self._pet_sprite_cache = {}  # TILE_SIZE -> {(facing, frame): surface}
         self.tile_surfaces = {}
         self.objects = {}
         self.remaining_treats = 0
-        self._load_assets()
         self.total_treats = 0
         self.collected_treats = 0
+        # Static per-level transition model, see _build_transition_tables
+        self.next_cell = None
+        self.outcome = None
+        self.treat_index = None
+        self.treat_mask = 0  # bit i set while treat i is still on the map
         self.step_count = 0
+        self.sounds = {}
+        # path to temporary level file used for learning (copied from original on reset)
+        self.temp_level_file = None
+        self.persistence = persistence
+        self.state_encoding = state_encoding
+        self._encode_treats = state_encoding == "cell_treats"
+        self.compact_states = compact_states
+        # Cell state numbering of the current level, see _state_maps
+        self.cell_of_state = None
+        self.state_of_cell = None
+        self._dirty_temp_files = set()  # temp files that no longer match their original
+        self._temp_pending = False  # "episode" mode: grid changed since the last write
+        self._temp_writer = _TempFileWriter() if persistence == "background" else None
+        # level index -> parsed initial layout, restored on every reset
+        self._level_snapshots = {}
+        # (level, TILE_SIZE) the tile surfaces / trap frames were last built for
+        self._assets_key = None
+        self._trap_key = None
+        # Renderer caches: baked floor/wall surface and what the last render_frame drew
+        self._static_layer = None
+        self._static_key = None
+        self._treat_cells = []
+        self._trap_cells = []
+        self._frame = None
+        # UI caches: fonts, rendered text surfaces and the scaled treat icon
+        self._fonts = {}
+        self._text_cache = {}
+        self._treat_icon = None
+
+        if not headless:
+            self.attach_renderer()
+
+    def attach_renderer(self):
+        """
+        Import pygame and load everything the visual modes need (tiles, pet sprite,
+        trap animation and sounds). Safe to call on a headless env at any time.
+        """
+        _import_pygame()
+        self.headless = False
+        pygame.mixer.init()
+        self._load_assets()
+        if self.grid is not None:
+            self._load_trap_animation(tile=self.TILE_SIZE)
+
         self.sounds = {
             "treat": pygame.mixer.Sound("assets/sounds/treat.wav"),
             "trap": pygame.mixer.Sound("assets/sounds/trap.wav"),
             "level_complete": pygame.mixer.Sound("assets/sounds/level_complete.wav"),
             "background_music": pygame.mixer.Sound("assets/sounds/level_2.mp3"),
         }
-        # path to temporary level file used for learning (copied from original on reset)
-        self.temp_level_file = None
-
         for s in self.sounds.values():
             s.set_volume(0.6)
 
@@ -68,6 +244,8 @@ class GridWorldEnv:
         return pygame.transform.scale(img, (self.TILE_SIZE, self.TILE_SIZE))
 
     def _load_assets(self):
+        if self.headless:
+            return
 
         # default images (used if level not found in dict)
         default_tiles = {
@@ -92,7 +270,26 @@ class GridWorldEnv:
             ".": self._safe_load("tiles", default_tiles["."]),
             "P": None,  # Pet drawn separately
         }
-        self.pet_surface = self._safe_load("pets", "siameseFront.png")
+        self._load_pet_sprites()
+        self._assets_key = (self.current_level, self.TILE_SIZE)
+        self._static_layer = None  # rebaked from the new tiles on the next render
+        self._treat_icon = None
+        self.pet_facing, self.pet_frame = "DOWN", ""
+        self.pet_surface = self.pet_sprites[(self.pet_facing, self.pet_frame)]
+
+    def _load_pet_sprites(self):
+        """
+        Decode and scale every pet facing/frame once per TILE_SIZE so move_pet
+        only has to switch between already prepared surfaces.
+        """
+        sprites = self._pet_sprite_cache.get(self.TILE_SIZE)
+        if sprites is None:
+            sprites = {}
+            for facing, prefix in PET_SPRITES.items():
+                for frame in PET_FRAMES:
+                    sprites[(facing, frame)] = self._safe_load("pets", f"{prefix}{frame}.png")
+            self._pet_sprite_cache[self.TILE_SIZE] = sprites
+        self.pet_sprites = sprites
 
     # ----------------------------
     # Animations
@@ -117,11 +314,10 @@ class GridWorldEnv:
                 surf = pygame.transform.smoothscale(surf, (tile, tile))
                 self.trap_frames.append(surf)
             except Exception as e:
-                print(f"Exception: {e}")
-                pass
+                logger.warning("Could not load trap frame '%s': %s", path, e)
 
-        # Debug to see what it did
-        print(f"[trap anim] level={self.current_level+1} folder={folder} frames={len(self.trap_frames)}")
+        logger.debug("[trap anim] level=%d folder=%s frames=%d",
+                     self.current_level + 1, folder, len(self.trap_frames))
 
         if not self.trap_frames:
             # fall back to static trap tile if available
@@ -129,36 +325,37 @@ class GridWorldEnv:
             self.trap_frames = [static] if static is not None else [None]
 
         self.trap_ms_per_frame = 500  # ~5 miliseconds wait per frame change
+        self._trap_key = (self.current_level, tile)
 
 
     # --------------------------------
     # Helper functions for animations
     # --------------------------------
 
+    def _trap_frame_index(self):
+        """Index of the trap animation frame to show right now."""
+        if not getattr(self, "trap_frames", None):
+            return 0
+        now = pygame.time.get_ticks()
+        return (now // self.trap_ms_per_frame) % len(self.trap_frames)
+
     def _trap_current_frame(self):
         """Return the current frame for the animated trap."""
         if not getattr(self, "trap_frames", None):
             return None
-        now = pygame.time.get_ticks()
-        idx = (now // self.trap_ms_per_frame) % len(self.trap_frames)
-        return self.trap_frames[idx]
+        return self.trap_frames[self._trap_frame_index()]
 
 
     # ----------------------------
     # Map loading
     # ----------------------------
     def _load_map(self, filename):
-        grid = []
-        with open(filename, "r") as f:
-            for line in f:
-                row = line.strip()
-                if not row:
-                    continue
-                grid.append(list(row))
-
-        print(f"Loaded {filename}:")  # Debug
-        for row in grid:
-            print("".join(row))
+        """Load a level through the compiled .npz cache; ragged rows come back padded with walls."""
+        self.level = compile_level(filename)
+        grid = self.level.to_grid()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Loaded %s:\n%s", filename, "\n".join("".join(row) for row in grid))
 
         return grid
 
@@ -181,104 +378,218 @@ class GridWorldEnv:
         # Store total treats at this level
         self.total_treats = self.remaining_treats
 
+    def _build_transition_tables(self):
+        """
+        Precompute the static move model of the current level, indexed by grid
+        cell (row * cols + col, not the compact state) and action index:
+
+            next_cell[s, a]  cell the pet ends up in (s itself when blocked)
+            outcome[s, a]    EMPTY / WALL / TREAT / TRAP for that move
+            treat_index[s]   bit of the treat on cell s in treat_mask, or -1
+
+        Only treats change during an episode, so a TREAT outcome counts as EMPTY
+        once its bit is cleared in treat_mask. Planners and VecGridWorldEnv use
+        these tables directly.
+        """
+        tiles = self.level.tiles
+        rows, cols = tiles.shape
+        flat = tiles.ravel()
+        cells = np.arange(rows * cols)
+        r, c = np.divmod(cells, cols)
+
+        next_cell = np.empty((rows * cols, len(ACTIONS)), dtype=np.int64)
+        outcome = np.empty((rows * cols, len(ACTIONS)), dtype=np.uint8)
+        for a, (dr, dc) in enumerate(ACTION_DELTAS):
+            nr, nc = r + dr, c + dc
+            inside = (nr >= 0) & (nr < rows) & (nc >= 0) & (nc < cols)
+            dest = np.where(inside, nr * cols + nc, cells)
+            blocked = ~inside | (flat[dest] == level_compiler.WALL)
+            next_cell[:, a] = np.where(blocked, cells, dest)
+            outcome[:, a] = np.where(blocked, WALL, _TILE_OUTCOME[flat[dest]])
+
+        treat_index = np.full(rows * cols, -1, dtype=np.int64)
+        treats = self.level.treats
+        treat_index[treats[:, 0] * cols + treats[:, 1]] = np.arange(len(treats))
+
+        self.next_cell = next_cell
+        self.outcome = outcome
+        self.treat_index = treat_index
+
     # ----------------------------
     # Environment API
     # ----------------------------
     def reset(self, level_index=0):
+        """
+        Restore the level to its initial layout and return the grid.
+
+        The first reset of a level parses it and keeps an in-memory snapshot;
+        every later reset (including the one after hitting a trap) restores that
+        snapshot with a plain copy, without touching the level files or reloading
+        any images.
+        """
+        # "episode" persistence: record how the finished episode left the map
+        self._flush_temp_map()
         self.current_level = level_index
 
+        snapshot = self._level_snapshots.get(level_index)
+        if snapshot is None:
+            snapshot = self._load_level_snapshot(level_index)
+            self._level_snapshots[level_index] = snapshot
+        self._restore_snapshot(snapshot)
+
+        if not self.headless:
+            key = (level_index, self.TILE_SIZE)
+            if self._assets_key != key:
+                self._load_assets()
+            else:
+                # Pet faces front again after a reset
+                self.pet_facing, self.pet_frame = "DOWN", ""
+                self.pet_surface = self.pet_sprites[(self.pet_facing, self.pet_frame)]
+            if self._trap_key != key:
+                self._load_trap_animation(tile=self.TILE_SIZE)
+        return self.grid
+
+    def _load_level_snapshot(self, level_index):
+        """Copy the level into its temp file, parse it and return the initial snapshot."""
         # Create a temporary copy of the original level file that we'll use for learning.
         orig_path = self.level_files[level_index]
+        if self.persistence == "off":
+            self.temp_level_file = None
+            self.grid = self._load_map(orig_path)
+            self._generate_objects()
+            self._build_transition_tables()
+            return self._make_snapshot()
+
         levels_dir = os.path.dirname(orig_path) or "."
         temp_name = f"temp_{os.path.basename(orig_path)}"
         temp_path = os.path.join(levels_dir, temp_name)
         try:
             shutil.copyfile(orig_path, temp_path)
             self.temp_level_file = temp_path
-            print(f"\nRESET: Copied original level file {orig_path} to temp file {temp_path}")
+            logger.debug("RESET: Copied original level file %s to temp file %s", orig_path, temp_path)
         except Exception as e:
-            print(f"Warning: could not create temp level file: {e}. Using original level file.")
+            logger.warning("Could not create temp level file: %s. Using original level file.", e)
             self.temp_level_file = orig_path
 
-        self._load_assets()
-        # Load from temp file so modifications are persistent for the learning run
-        self.grid = self._load_map(self.temp_level_file)
+        # Parse the original (the temp copy is identical right now) so the compiled
+        # cache is keyed by the real level file
+        self.grid = self._load_map(orig_path)
         self._generate_objects()
-        self._load_trap_animation(tile=self.TILE_SIZE)  
-        return self.grid
+        self._build_transition_tables()
+        return self._make_snapshot()
+
+    def _make_snapshot(self):
+        return {
+            "level": self.level,
+            "grid": [row[:] for row in self.grid],
+            "objects": dict(self.objects),
+            "treats": self.remaining_treats,
+            "pet_start": list(self.pet_pos),
+            "temp_level_file": self.temp_level_file,
+            "tables": (self.next_cell, self.outcome, self.treat_index),
+            # Plain-list copies for the scalar lookups in _move (faster than NumPy scalars)
+            "table_rows": (self.next_cell.tolist(), self.outcome.tolist(), self.treat_index.tolist()),
+            "states": self._state_maps(),
+        }
 
+    def _state_maps(self):
+        """
+        (cell_of_state, state_of_cell, state_of_cell as a list) for the current level.
+        Compact numbering covers walkable cells only (state_of_cell is -1 on walls);
+        otherwise every cell is its own state.
+        """
+        if self.compact_states:
+            cell_of_state, state_of_cell = self.level.cell_of_state, self.level.state_of_cell
+        else:
+            cell_of_state = state_of_cell = np.arange(self.level.tiles.size)
+        return cell_of_state, state_of_cell, state_of_cell.tolist()
+
+    def _restore_snapshot(self, snapshot):
+        """Put the level back to its snapshot layout (O(cells) copy, no file or asset I/O)."""
+        self.level = snapshot["level"]
+        self.grid = [row[:] for row in snapshot["grid"]]
+        self.objects = dict(snapshot["objects"])
+        self.remaining_treats = snapshot["treats"]
+        self.total_treats = snapshot["treats"]
+        self.pet_pos = list(snapshot["pet_start"])
+        # Static tables are shared, never mutated, so no copy is needed
+        self.next_cell, self.outcome, self.treat_index = snapshot["tables"]
+        self._cols = self.level.tiles.shape[1]
+        self.cell_of_state, self.state_of_cell, self._state_of_cell_list = snapshot["states"]
+        self._states_per_mask = len(self.cell_of_state)
+        self._next_cell_rows = snapshot["table_rows"][0]
+        self._outcome_rows = snapshot["table_rows"][1]
+        self._treat_index_list = snapshot["table_rows"][2]
+        self.treat_mask = (1 << len(self.level.treats)) - 1
+        self.temp_level_file = snapshot["temp_level_file"]
+
+        # The temp file only differs from the original once a treat was written out
+        if self.temp_level_file in self._dirty_temp_files:
+            self._sync_temp_map()
+            self._dirty_temp_files.discard(self.temp_level_file)
 
     def move_pet(self, action):
-        dr, dc = 0, 0
-        r, c = self.pet_pos
+        """Move the pet by action name ("UP"/"DOWN"/"LEFT"/"RIGHT"); returns (level_changed, tile)."""
+        if action not in ACTION_INDEX:
+            self.step_count += 1
+            return False, "empty"
+        return self._move(ACTION_INDEX[action])
+
+    def _move(self, a):
+        """Move the pet by action index using the precomputed transition tables."""
         if self.step_count%2==0:
             num = '2'
         else:
             num = ''
-        if action == "UP":
-            self.pet_surface = self._safe_load("pets", f"siameseBack{num}.png")
-            dr, dc = -1, 0
-        elif action == "DOWN":
-            self.pet_surface = self._safe_load("pets", f"siameseFront{num}.png")
-            dr, dc = 1, 0
-        elif action == "LEFT":
-            self.pet_surface = self._safe_load("pets", f"siameseLeft{num}.png")
-            dr, dc = 0, -1
-        elif action == "RIGHT":
-            self.pet_surface = self._safe_load("pets", f"siameseRight{num}.png")
-            dr, dc = 0, 1
-
-        nr, nc = self.pet_pos[0] + dr, self.pet_pos[1] + dc
+
+        # Switch facing/frame; the sprite table is prebuilt so no disk access here
+        self.pet_facing, self.pet_frame = ACTIONS[a], num
+        if not self.headless:
+            self.pet_surface = self.pet_sprites[(self.pet_facing, num)]
         self.step_count += 1
 
-        # Stay inside bounds
-        if nr < 0 or nr >= len(self.grid) or nc < 0 or nc >= len(self.grid[0]):
-            return False, "wall"
+        cell = self.pet_pos[0] * self._cols + self.pet_pos[1]
+        tile = self._outcome_rows[cell][a]
 
-        # Check wall
-        if self.objects.get((nr, nc)) == "#":
+        # Walls and the map edge keep the pet in place
+        if tile == WALL:
             return False, "wall"
 
+        nxt = self._next_cell_rows[cell][a]
+        nr, nc = divmod(nxt, self._cols)
         self.pet_pos = [nr, nc]
 
-        # Check object interactions
-        if (nr, nc) in self.objects:
-            obj = self.objects.pop((nr, nc))
-
-            if obj == "T":
-                # Update both runtime objects and the grid file used for learning
-                self.remaining_treats -= 1
-                print(f"\nTREAT: Updating temp file {self.temp_level_file}")
-                print("Grid before update:")
-                for row in self.grid:
-                    print("".join(row))
-                
-                try:
-                    self.grid[nr][nc] = "."
-                    self._write_temp_map()
-                    print("\nGrid after update:")
-                    for row in self.grid:
-                        print("".join(row))
-                except Exception as e:
-                    print(f"Warning: failed to update temp level file: {e}")
-
-                if "treat" in self.sounds:
-                    self.sounds["treat"].play()
-                if self.remaining_treats == 0:
-                    print("Level complete!")
-                    if "level_complete" in self.sounds:
-                        self.sounds["level_complete"].play()
-                    self._next_level()
-                    return True, "finished"
-                return False, "treat"
-
-            elif obj == "X":
-                print("Game over! Pet hit a trap.")
-                if "trap" in self.sounds:
-                    self.sounds["trap"].play()
-                # Reset will copy original level back into the temp file
-                self.reset(self.current_level)
-                return False, "trap"
+        if tile == TREAT:
+            bit = self._treat_index_list[nxt]
+            if not (self.treat_mask >> bit) & 1:
+                return False, "empty"  # already eaten this episode
+
+            # Update both runtime objects and the grid file used for learning
+            self.treat_mask &= ~(1 << bit)
+            self.objects.pop((nr, nc), None)
+            self.remaining_treats -= 1
+            self.grid[nr][nc] = "."
+            self._on_grid_changed()
+
+            if "treat" in self.sounds:
+                self.sounds["treat"].play()
+            if self.remaining_treats == 0:
+                logger.info("Level complete!")
+                self._flush_temp_map()
+                if "level_complete" in self.sounds:
+                    self.sounds["level_complete"].play()
+                self._next_level()
+                return True, "finished"
+            return False, "treat"
+
+        if tile == TRAP:
+            self.objects.pop((nr, nc), None)
+            logger.info("Game over! Pet hit a trap.")
+            if "trap" in self.sounds:
+                self.sounds["trap"].play()
+            # Reset will copy original level back into the temp file
+            self.reset(self.current_level)
+            return False, "trap"
 
         return False, "empty"
 
@@ -286,7 +597,7 @@ class GridWorldEnv:
         if self.current_level + 1 < len(self.level_files):
             self.reset(self.current_level + 1)
         else:
-            print("You win! All levels complete.")
+            logger.info("You win! All levels complete.")
 
     # ----------------------------
     # Rendering
@@ -303,48 +614,141 @@ class GridWorldEnv:
                     line += "."
             print(line)
 
-    def render_pygame(self, screen):
+    def _bake_static_layer(self):
+        """Pre-draw the parts of the map that never change (floor and walls) into one surface."""
         rows = len(self.grid)
         cols = len(self.grid[0])
-
+        T = self.TILE_SIZE
+        layer = pygame.Surface((cols * T, rows * T)).convert()
+        floor = self.tile_surfaces["."]
+        wall = self.tile_surfaces.get("#")
+        walls = self.level.tiles == level_compiler.WALL
         for r in range(rows):
             for c in range(cols):
-                # Always draw background first
-                bg_tile = self.tile_surfaces["."]
-                screen.blit(bg_tile, (c * self.TILE_SIZE, r * self.TILE_SIZE))
-
-                # Draw foreground objects if present
-                if (r, c) in self.objects:
-                    obj = self.objects[(r, c)]
-
-                    # Animated trap: draw current frame instead of static tile
-                    if obj == "X":
-                        frame = self._trap_current_frame()
-                        if frame is not None:
-                            screen.blit(frame, (c * self.TILE_SIZE, r * self.TILE_SIZE))
-                        else:
-                            # fallback to default or just the static version of it
-                            tile = self.tile_surfaces.get("X")
-                            if tile:
-                                screen.blit(tile, (c * self.TILE_SIZE, r * self.TILE_SIZE))
-                    else:
-                        tile = self.tile_surfaces.get(obj)
-                        if tile:
-                            screen.blit(tile, (c * self.TILE_SIZE, r * self.TILE_SIZE))
+                layer.blit(floor, (c * T, r * T))
+                if walls[r, c] and wall:
+                    layer.blit(wall, (c * T, r * T))
+        self._static_layer = layer
+        self._static_key = (self.current_level, T)
+        # Cells whose drawing can change during an episode
+        self._treat_cells = [tuple(int(v) for v in rc) for rc in self.level.treats]
+        self._trap_cells = [tuple(int(v) for v in rc) for rc in self.level.traps]
+
+    def _ensure_static_layer(self):
+        if self._static_layer is None or self._static_key != (self.current_level, self.TILE_SIZE):
+            self._bake_static_layer()
+
+    def _draw_object(self, screen, obj, x, y):
+        # Animated trap: draw current frame instead of static tile
+        if obj == "X":
+            frame = self._trap_current_frame()
+            if frame is not None:
+                screen.blit(frame, (x, y))
+            else:
+                # fallback to default or just the static version of it
+                tile = self.tile_surfaces.get("X")
+                if tile:
+                    screen.blit(tile, (x, y))
+        elif obj != "#":
+            tile = self.tile_surfaces.get(obj)
+            if tile:
+                screen.blit(tile, (x, y))
+
+    def _draw_cell(self, screen, r, c):
+        """Repaint one cell from the static layer plus whatever object is on it."""
+        T = self.TILE_SIZE
+        x, y = c * T, r * T
+        screen.blit(self._static_layer, (x, y), (x, y, T, T))
+        obj = self.objects.get((r, c))
+        if obj is not None:
+            self._draw_object(screen, obj, x, y)
+
+    def render_pygame(self, screen):
+        """Draw the whole map: the baked floor/wall layer, then treats and traps."""
+        self._ensure_static_layer()
+        screen.blit(self._static_layer, (0, 0))
+        T = self.TILE_SIZE
+        for r, c in self._treat_cells + self._trap_cells:
+            obj = self.objects.get((r, c))
+            if obj is not None:
+                self._draw_object(screen, obj, c * T, r * T)
+
+    def render_frame(self, screen, mode="PLAYER", episode=None, total_reward=None, epsilon=None):
+        """
+        Draw map, UI and HUD like render_pygame + render_ui + render_hud, but only
+        repaint what changed since the previous frame on the same screen: the pet's
+        old and new cells, eaten (or restored) treats, traps when their animation
+        frame advances, and the areas under last frame's UI/HUD.
+
+        Returns the list of rects to pass to pygame.display.update().
+        """
+        self._ensure_static_layer()
+        prev = self._frame
+        pet = tuple(self.pet_pos)
+        treats = frozenset(cell for cell in self._treat_cells if cell in self.objects)
+        trap_idx = self._trap_frame_index()
+
+        full = (prev is None or prev["screen"] is not screen or prev["size"] != screen.get_size()
+                or prev["layer"] is not self._static_layer)
+        if full:
+            screen.fill((0, 0, 0))
+            self.render_pygame(screen)
+            ui = self.render_ui(screen)
+            hud = self.render_hud(screen, mode=mode, episode=episode,
+                                  total_reward=total_reward, epsilon=epsilon)
+            rects = [screen.get_rect()]
+        else:
+            cells = {prev["pet"], pet}
+            cells.update(prev["treats"] ^ treats)
+            if trap_idx != prev["trap_idx"]:
+                cells.update(self._trap_cells)
+            for rect in (prev["ui"], prev["hud"]):
+                cells.update(self._cells_under(rect))
+
+            T = self.TILE_SIZE
+            rects = []
+            for r, c in cells:
+                self._draw_cell(screen, r, c)
+                rects.append(pygame.Rect(c * T, r * T, T, T))
+            ui = self.render_ui(screen)
+            hud = self.render_hud(screen, mode=mode, episode=episode,
+                                  total_reward=total_reward, epsilon=epsilon)
+            rects += [prev["ui"], prev["hud"], ui, hud]
+
+        self._frame = {
+            "screen": screen,
+            "size": screen.get_size(),
+            "layer": self._static_layer,
+            "pet": pet,
+            "treats": treats,
+            "trap_idx": trap_idx,
+            "ui": ui,
+            "hud": hud,
+        }
+        return rects
+
+    def _cells_under(self, rect):
+        """Grid cells overlapped by a pixel rect."""
+        T = self.TILE_SIZE
+        rows = len(self.grid)
+        cols = len(self.grid[0])
+        r0, r1 = max(rect.top // T, 0), min((rect.bottom - 1) // T, rows - 1)
+        c0, c1 = max(rect.left // T, 0), min((rect.right - 1) // T, cols - 1)
+        return [(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
 
     def render_ui(self, screen):
         total_treats = self.get_total_treats()  # total in level
         collected = total_treats - self.remaining_treats  # already picked up
 
-        # Apple icon
-        apple_icon = pygame.transform.scale(self.tile_surfaces["T"], (32, 32))
-        screen.blit(apple_icon, (10, 10))
+        # Apple icon (scaled once per treat tile)
+        if self._treat_icon is None:
+            self._treat_icon = pygame.transform.scale(self.tile_surfaces["T"], (32, 32))
+        area = screen.blit(self._treat_icon, (10, 10))
 
         # Counter text
-        font = pygame.font.Font(None, 36)
         counter_text = f"{collected}/{total_treats}"
-        text_surface = font.render(counter_text, True, (255, 255, 255))
-        screen.blit(text_surface, (50, 15))
+        text_surface = self._text("counter", counter_text)
+        area.union_ip(screen.blit(text_surface, (50, 15)))
 
         # Progress bar background
         bar_width = 200
@@ -352,6 +756,7 @@ class GridWorldEnv:
         bar_x = 10
         bar_y = 50
         pygame.draw.rect(screen, (50, 50, 50), (bar_x, bar_y, bar_width, bar_height))
+        area.union_ip(pygame.Rect(bar_x, bar_y, bar_width, bar_height))
 
         # Progress fill
         if total_treats > 0:
@@ -374,26 +779,22 @@ class GridWorldEnv:
 
         # Completion message
         if collected == total_treats and total_treats > 0:
-            complete_font = pygame.font.Font(None, 24)
-            complete_text = complete_font.render(
-                "All treats collected!", True, (100, 255, 100)
-            )
-            screen.blit(complete_text, (bar_x, bar_y + 25))
+            complete_text = self._text("complete", "All treats collected!", (100, 255, 100))
+            area.union_ip(screen.blit(complete_text, (bar_x, bar_y + 25)))
 
         # Draw pet
         screen.blit(
             self.pet_surface,
             (self.pet_pos[1] * self.TILE_SIZE, self.pet_pos[0] * self.TILE_SIZE),
         )
+        return area
 
     def render_hud(self, screen, mode="PLAYER", episode=None, total_reward=None, epsilon=None):
         """
         Draws HUD on the top-right corner.
         Small text, clean layout, supports training and gameplay.
+        Returns the rect covered by the HUD text.
         """
-
-        font = pygame.font.SysFont("Arial", 18)
-
         lines = [
             f"Level: {self.current_level + 1}",
             f"Steps: {self.step_count}",
@@ -411,43 +812,61 @@ class GridWorldEnv:
 
         # Draw each line aligned to top-right
         y = 10
+        area = None
         for text in lines:
-            surf = font.render(text, True, (255, 255, 255))
+            surf = self._text("hud", text)
             x = screen.get_width() - surf.get_width() - 15
-            screen.blit(surf, (x, y))
+            drawn = screen.blit(surf, (x, y))
+            area = drawn if area is None else area.union(drawn)
             y += 22  
+        return area
+
+    def _font(self, key):
+        """Create each UI font once; SysFont does a system font lookup on every call."""
+        font = self._fonts.get(key)
+        if font is None:
+            name, size = UI_FONTS[key]
+            font = pygame.font.SysFont(name, size) if name else pygame.font.Font(None, size)
+            self._fonts[key] = font
+        return font
+
+    def _text(self, font_key, text, color=(255, 255, 255)):
+        """Rendered text surface, re-rendered only when the string (or colour) changes."""
+        key = (font_key, text, color)
+        surf = self._text_cache.get(key)
+        if surf is None:
+            if len(self._text_cache) >= TEXT_CACHE_SIZE:
+                self._text_cache.clear()
+            surf = self._font(font_key).render(text, True, color)
+            self._text_cache[key] = surf
+        return surf
 
     def get_state(self):
-        """Return the current state as an integer index for Q-learning."""
-        cols = len(self.grid[0])
-        return self.pet_pos[0] * cols + self.pet_pos[1]
+        """Return the current state as an integer index for Q-learning (see state_encoding)."""
+        state = self._state_of_cell_list[self.pet_pos[0] * self._cols + self.pet_pos[1]]
+        if self._encode_treats:
+            return state + self._states_per_mask * self.treat_mask
+        return state
+
+    def state_at(self, row, col):
+        """State the pet would be in on (row, col) with the current treats; None for walls and off-grid."""
+        rows, cols = self.level.shape
+        if not (0 <= row < rows and 0 <= col < cols) or self.level.tiles[row, col] == level_compiler.WALL:
+            return None
+        state = self._state_of_cell_list[row * cols + col]
+        if self._encode_treats:
+            return state + self._states_per_mask * self.treat_mask
+        return state
 
     def step(self, action_idx):
         """
         Take an action by index, return (next_state, reward, done, info)
         """
-        action = ACTIONS[action_idx]
-        level_changed, tile = self.move_pet(action)
+        level_changed, tile = self._move(action_idx)
 
         # Reward logic
-        if tile == "finished":
-            reward = 15
-            done = True
-        elif tile == "trap":
-            reward = -50
-            done = True
-        elif tile == "treat":
-            reward = 15
-            done = False
-        elif tile == "empty":
-            reward = -1
-            done = False
-        elif tile == "wall":
-            reward = -5
-            done = False
-        else:
-            reward = 0
-            done = False
+        reward = REWARDS.get(tile, 0)
+        done = tile in TERMINAL_TILES
 
         next_state = self.get_state()
         info = {"tile": tile}
@@ -455,8 +874,11 @@ class GridWorldEnv:
 
     @property
     def num_states(self):
-        """Number of possible states (positions) in the grid."""
-        return len(self.grid) * len(self.grid[0])
+        """Number of possible states: cell states, times 2**treats for the "cell_treats" encoding."""
+        cells = len(self.cell_of_state)
+        if self._encode_treats:
+            return cells << len(self.level.treats)
+        return cells
 
     @property
     def num_actions(self):
@@ -466,13 +888,49 @@ class GridWorldEnv:
     # ----------------------------
     # File helpers for temp level persistence
     # ----------------------------
+    def _on_grid_changed(self):
+        """Propagate a grid change (treat eaten) to the temp file per the persistence mode."""
+        if self.persistence == "off" or not self.temp_level_file:
+            return
+        if self.persistence == "episode":
+            self._temp_pending = True
+            return
+
+        if self.persistence == "sync" and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("TREAT: Updating temp file %s\nGrid after update:\n%s",
+                         self.temp_level_file, self._grid_text().rstrip("\n"))
+        self._sync_temp_map()
+        self._dirty_temp_files.add(self.temp_level_file)
+
+    def _sync_temp_map(self):
+        """Write the grid now ("sync") or queue it for the writer thread ("background")."""
+        if self._temp_writer is not None:
+            self._temp_writer.submit(self.temp_level_file, self._grid_text())
+        else:
+            self._write_temp_map()
+
+    def _flush_temp_map(self):
+        """Write the pending end-of-episode grid in "episode" mode."""
+        if self._temp_pending:
+            self._write_temp_map()
+            self._temp_pending = False
+
+    def close(self):
+        """Flush pending temp file writes and stop the background writer, if any."""
+        self._flush_temp_map()
+        if self._temp_writer is not None:
+            self._temp_writer.close()
+            self._temp_writer = None
+
+    def _grid_text(self):
+        return "".join("".join(row) + "\n" for row in self.grid)
+
     def _write_temp_map(self):
         """Write current grid to the temp level file so collected treats are removed from disk used for learning."""
         if not self.temp_level_file:
             return
         try:
             with open(self.temp_level_file, "w", encoding="utf-8") as f:
-                for row in self.grid:
-                    f.write("".join(row) + "\n")
+                f.write(self._grid_text())
         except Exception as e:
-            print(f"Error writing temp level file '{self.temp_level_file}': {e}")
+            logger.error("Error writing temp level file '%s': %s", self.temp_level_file, e)
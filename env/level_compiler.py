@@ -0,0 +1,157 @@
+import os
+import hashlib
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Tile codes used in the compiled uint8 array. The pet start is stored
+# separately and its cell is compiled as floor.
+FLOOR, WALL, TREAT, TRAP = range(4)
+TILE_CODES = {".": FLOOR, "#": WALL, "T": TREAT, "X": TRAP, "P": FLOOR}
+TILE_CHARS = ".#TX"
+
+# Short rows are padded with walls so every level is a full rectangle
+PAD_CHAR = "#"
+
+# Bump when the .npz layout changes so stale cache files are ignored
+CACHE_VERSION = 1
+
+
+class CompiledLevel:
+    """
+    A level parsed into arrays:
+        tiles   (rows, cols) uint8  tile code per cell (FLOOR/WALL/TREAT/TRAP)
+        start   (2,)         int    pet start (row, col)
+        treats  (k, 2)       int    treat coordinates, row-major order
+        traps   (k, 2)       int    trap coordinates
+        walls   (k, 2)       int    wall coordinates (including padding)
+
+    and the compact state numbering, which skips walls since the pet never stands on one:
+        cell_of_state  (n,)          int  flat cell (row * cols + col) of each walkable state
+        state_of_cell  (rows * cols,) int  compact state of each cell, -1 for walls
+    """
+
+    def __init__(self, tiles, start, source_hash, source=None):
+        self.tiles = tiles
+        self.start = start
+        self.source_hash = source_hash
+        self.source = source
+        self.treats = np.argwhere(tiles == TREAT)
+        self.traps = np.argwhere(tiles == TRAP)
+        self.walls = np.argwhere(tiles == WALL)
+        self.cell_of_state = np.flatnonzero(tiles.ravel() != WALL)
+        self.state_of_cell = np.full(tiles.size, -1, dtype=np.int64)
+        self.state_of_cell[self.cell_of_state] = np.arange(len(self.cell_of_state))
+
+    @property
+    def shape(self):
+        return self.tiles.shape
+
+    @property
+    def num_walkable(self):
+        return len(self.cell_of_state)
+
+    def compact_table(self, Q):
+        """
+        Convert a Q-table indexed by grid cell (row * cols + col, optionally
+        + rows * cols * treat_mask) to the compact walkable-state numbering.
+        Wall rows are dropped; they could never be visited anyway.
+        """
+        num_masks, rest = divmod(Q.shape[0], self.tiles.size)
+        if rest or not num_masks:
+            raise ValueError(f"Q-table with {Q.shape[0]} rows is not indexed by the "
+                             f"{self.tiles.size} cells of {self.source}")
+        by_mask = Q.reshape(num_masks, self.tiles.size, *Q.shape[1:])
+        return by_mask[:, self.cell_of_state].reshape(num_masks * self.num_walkable, *Q.shape[1:])
+
+    def to_grid(self):
+        """Return the level as the list-of-char-lists grid GridWorldEnv works with."""
+        chars = np.array(list(TILE_CHARS))[self.tiles]
+        grid = [list(row) for row in chars]
+        grid[self.start[0]][self.start[1]] = "P"
+        return grid
+
+
+def hash_level_file(path):
+    """sha1 of the raw level file; identifies the exact map a cache (or Q-table) was built from."""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def parse_level_text(text):
+    """
+    Parse level text into (tiles, start).
+    Blank lines are skipped and ragged rows are padded with walls.
+    """
+    rows = [line.strip() for line in text.splitlines()]
+    rows = [row for row in rows if row]
+    if not rows:
+        raise ValueError("level has no rows")
+
+    width = max(len(row) for row in rows)
+    tiles = np.full((len(rows), width), TILE_CODES[PAD_CHAR], dtype=np.uint8)
+    start = None
+    for r, row in enumerate(rows):
+        for c, ch in enumerate(row):
+            if ch not in TILE_CODES:
+                raise ValueError(f"unknown tile {ch!r} at row {r}, col {c}")
+            tiles[r, c] = TILE_CODES[ch]
+            if ch == "P":
+                start = (r, c)
+    if start is None:
+        raise ValueError("level has no pet start 'P'")
+    return tiles, np.array(start, dtype=np.int64)
+
+
+def _cache_path(path, source_hash, cache_dir):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}-{source_hash[:16]}.npz")
+
+
+def compile_level(path, cache_dir=None):
+    """
+    Compile a level text file, using the .npz cache next to it when possible.
+
+    The cache file name includes the source hash, so editing a level simply
+    produces a new cache entry; the .txt file stays the source of truth.
+
+    Args:
+        path (str): level text file.
+        cache_dir (str | None): where .npz files live; defaults to <level dir>/.cache.
+                                Pass False to skip the cache entirely.
+
+    Returns:
+        CompiledLevel
+    """
+    source_hash = hash_level_file(path)
+    if cache_dir is False:
+        with open(path, "r", encoding="utf-8") as f:
+            tiles, start = parse_level_text(f.read())
+        return CompiledLevel(tiles, start, source_hash, source=path)
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path) or ".", ".cache")
+    cache_file = _cache_path(path, source_hash, cache_dir)
+
+    try:
+        with np.load(cache_file) as data:
+            if int(data["version"]) == CACHE_VERSION:
+                return CompiledLevel(data["tiles"], data["start"], source_hash, source=path)
+    except (OSError, KeyError, ValueError):
+        pass  # missing or unreadable cache: rebuild below
+
+    with open(path, "r", encoding="utf-8") as f:
+        tiles, start = parse_level_text(f.read())
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename so parallel trainers never read a half-written cache
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as f:
+            np.savez(f, tiles=tiles, start=start, version=CACHE_VERSION)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.warning("Could not write level cache '%s': %s", cache_file, e)
+
+    return CompiledLevel(tiles, start, source_hash, source=path)
@@ -1,58 +1,129 @@
 from env.gridworld_env import ACTIONS
+from collections.abc import MutableMapping
+import numpy as np
 import random
 
 
 class QLearningAgent:
+    """
+    Tabular Q-learning over (row, col) states and action names.
+
+    Values live in one NumPy array self.Q shaped (num_states, num_actions), with
+    rows in the env's state numbering and columns in ACTIONS order, so the table
+    is interchangeable with QAgent.Q (np.save it, or load a QAgent table into it).
+    state_index / action_index translate the tuple states and string actions.
+    """
 
     def __init__(self, env, actions = ACTIONS, alpha = 0.1, gamma = 0.8, epsilon = 0.5):
         self.env = env
-        self.actions = actions
+        self.actions = list(actions)
         self.alpha = alpha      # Learning rate
         self.gamma = gamma      # Discount factor
         self.epsilon = epsilon  # Exploration rate
-        self.q_table = self.__init__q_table(env)
+        self.state_index, self.action_index = self.__init__index_maps(env)
+        self.Q = np.zeros((len(self.state_index), len(self.actions)))
 
-    def __init__q_table(self, env):
+    def __init__index_maps(self, env):
         """
-        Initializes a Q-table for the environment.
-        The Q-table starts with all zeros.
+        Map each (row, col) the pet can stand on to its row in Q (the env's
+        state for that cell), and each action name to its column.
         """
-        q_table = {}
-        rows = len(env.grid)
         cols = len(env.grid[0])
+        state_index = {}
+        for state, cell in enumerate(env.cell_of_state.tolist()):
+            state_index[divmod(cell, cols)] = state
+        action_index = {a: i for i, a in enumerate(self.actions)}
+        return state_index, action_index
 
-        for r in range(rows):
-            for c in range(cols):
-                state = (r,c)
-                q_table[state] = {a: 0.0 for a in self.actions}
-        return q_table
+    @property
+    def q_table(self):
+        """
+        The values as the old {(r, c): {action: q}} dict, as a live view of self.Q:
+        agent.q_table[s][a] = v writes through to the array. Only cells the pet can
+        stand on have an entry; wall cells, which the old dict also listed, do not.
+        """
+        return _QTableView(self)
 
     def choose_action(self, state):
         """
-        Kitty chooses an action based on the current Q-values 
+        Kitty chooses an action based on the current Q-values
         in the current state.
         Employs epsilon-greedy strategy.
         """
-        current_options = self.q_table[state]
-
         if random.random() < self.epsilon:
             return random.choice(self.actions)
         else:
-            max_q = max(current_options.values())
-            best_actions = [a for a, q in current_options.items() if q == max_q]
-            return random.choice(best_actions)
+            # Every action tied for the best value, picked from at random; a 4-value
+            # row is quicker to scan as a list than through NumPy scalar calls
+            q = self.Q[self.state_index[state]].tolist()
+            max_q = max(q)
+            best_actions = [i for i, value in enumerate(q) if value == max_q]
+            return self.actions[random.choice(best_actions)]
 
     def update_q_value(self, state, action, reward, next_state):
         """
-        Using the formula: 
+        Using the formula:
 
         ---||  Q(s,a) <- Q(s,a) + Alpha*(R+gamma*max Q(s',a') - Q(s,a))  ||---
 
         The q-value for the current state given an action is updated once
         Kitty has taken the action and received a reward and the next state.
         """
-        current_q = self.q_table[state][action]
-        max_future_q = max(self.q_table[next_state].values())
-        new_q = current_q + self.alpha * (reward + self.gamma * max_future_q - current_q)
-        
-        self.q_table[state][action] = new_q
+        s = self.state_index[state]
+        a = self.action_index[action]
+        current_q = self.Q.item(s, a)
+        max_future_q = max(self.Q[self.state_index[next_state]].tolist())
+        self.Q[s, a] = current_q + self.alpha * (reward + self.gamma * max_future_q - current_q)
+
+
+class _QTableView(MutableMapping):
+    """{(r, c): {action: q}} view of a QLearningAgent's array; see QLearningAgent.q_table."""
+
+    def __init__(self, agent):
+        self._agent = agent
+
+    def __getitem__(self, state):
+        return _QRowView(self._agent, self._agent.state_index[state])
+
+    def __setitem__(self, state, values):
+        row = self[state]
+        for action, value in values.items():
+            row[action] = value
+
+    def __delitem__(self, state):
+        raise TypeError("states cannot be removed from a Q-table")
+
+    def __iter__(self):
+        return iter(self._agent.state_index)
+
+    def __len__(self):
+        return len(self._agent.state_index)
+
+    def __repr__(self):
+        return repr({state: dict(row) for state, row in self.items()})
+
+
+class _QRowView(MutableMapping):
+    """{action: q} view of one row of QLearningAgent.Q; writes go to the array."""
+
+    def __init__(self, agent, s):
+        self._agent = agent
+        self._s = s
+
+    def __getitem__(self, action):
+        return self._agent.Q.item(self._s, self._agent.action_index[action])
+
+    def __setitem__(self, action, value):
+        self._agent.Q[self._s, self._agent.action_index[action]] = value
+
+    def __delitem__(self, action):
+        raise TypeError("actions cannot be removed from a Q-table row")
+
+    def __iter__(self):
+        return iter(self._agent.actions)
+
+    def __len__(self):
+        return len(self._agent.actions)
+
+    def __repr__(self):
+        return repr(dict(self))
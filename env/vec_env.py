@@ -0,0 +1,134 @@
+import numpy as np
+from env.gridworld_env import (GridWorldEnv, TILES, REWARDS, TERMINAL_TILES,
+                               EMPTY, TREAT, FINISHED)
+
+
+class VecGridWorldEnv:
+    """
+    Steps N independent copies of one GridWorld level in a single vectorized call.
+
+    Every copy shares the same static map; only the per-copy state differs and is
+    stored as NumPy arrays:
+        pos        (N,)  current cell (row * cols + col)
+        treats     (N,)  bitmask of treats still on the map (bit i = treat i)
+        done       (N,)  True for copies that ended on the last step (before auto-reset)
+        steps      (N,)  steps taken in the current episode
+
+    Rewards follow GridWorldEnv.step exactly (+15 treat/finish, -50 trap, -5 wall,
+    -1 empty), and states are returned in GridWorldEnv's compact numbering
+    (state_of_cell[pos]), so Q-tables trained here can be loaded straight into QAgent.
+
+    Differences from GridWorldEnv:
+        - Finished or trapped copies auto-reset to the level start; the returned
+          next state is the start state (the single env moves on to the next level
+          on "finished" instead).
+        - Copies that hit max_steps are reset as well and flagged in info["truncated"]
+          without being marked done, matching the 500-step cap in the training loops.
+    """
+
+    def __init__(self, level_file, num_envs, max_steps=500):
+        """
+        Args:
+            level_file (str): path of the level text file every copy plays.
+            num_envs (int): number of independent copies N.
+            max_steps (int | None): episode length cap, or None for no cap.
+        """
+        self.level_file = level_file
+        self.num_envs = num_envs
+        self.max_steps = max_steps
+
+        # Parse the level once through the headless single env
+        env = GridWorldEnv(level_files=[level_file], headless=True, persistence="off")
+        env.reset(0)
+        self._build_tables(env)
+
+        self.pos = np.full(num_envs, self.start_cell, dtype=np.int64)
+        self.treats = np.full(num_envs, self.all_treats, dtype=np.int64)
+        self.done = np.zeros(num_envs, dtype=bool)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+
+    # ----------------------------
+    # Static level tables
+    # ----------------------------
+    def _build_tables(self, env):
+        """Take the next state, outcome and treat bit tables from the single env."""
+        rows, cols = env.level.shape
+        self.rows, self.cols = rows, cols
+        self.num_states = env.num_states
+        self.num_actions = env.num_actions
+        self.start_state = env.get_state()
+        self.state_of_cell = env.state_of_cell
+        self.start_cell = int(env.cell_of_state[self.start_state])
+
+        num_treats = len(env.level.treats)
+        if num_treats > 62:
+            raise ValueError(f"{self.level_file} has {num_treats} treats; at most 62 fit in the bitmask")
+        self.treat_bit = env.treat_index
+        self.all_treats = (1 << num_treats) - 1
+
+        self.next_state = env.next_cell
+        self.outcome = env.outcome
+
+        self.rewards = np.array([REWARDS[t] for t in TILES], dtype=np.float64)
+        self.terminal = np.array([t in TERMINAL_TILES for t in TILES], dtype=bool)
+
+    # ----------------------------
+    # Environment API
+    # ----------------------------
+    def reset(self):
+        """Reset every copy to the level start and return the (N,) state array."""
+        self.pos[:] = self.start_cell
+        self.treats[:] = self.all_treats
+        self.done[:] = False
+        self.steps[:] = 0
+        return self.state_of_cell[self.pos]
+
+    def get_state(self):
+        """Return the current (N,) state array."""
+        return self.state_of_cell[self.pos]
+
+    def step(self, actions):
+        """
+        Apply one action per copy.
+
+        Args:
+            actions (np.ndarray): int array of shape (N,) with action indices.
+
+        Returns:
+            next_states (N,) int, rewards (N,) float, dones (N,) bool,
+            info dict with "tile" (N,) outcome codes indexing TILES and
+            "truncated" (N,) bool.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        pos = self.pos
+
+        tile = self.outcome[pos, actions]
+        nxt = self.next_state[pos, actions]
+
+        # Treat tiles only count while their treat is still on this copy's map
+        bit = self.treat_bit[nxt]
+        is_treat = tile == TREAT
+        uneaten = is_treat & ((self.treats >> np.maximum(bit, 0)) & 1).astype(bool)
+        tile = np.where(is_treat & ~uneaten, EMPTY, tile)
+        self.treats = np.where(uneaten, self.treats & ~(1 << np.maximum(bit, 0)), self.treats)
+        tile = np.where(uneaten & (self.treats == 0), FINISHED, tile)
+
+        rewards = self.rewards[tile]
+        dones = self.terminal[tile]
+
+        self.pos = nxt
+        self.steps += 1
+        if self.max_steps is not None:
+            truncated = ~dones & (self.steps >= self.max_steps)
+        else:
+            truncated = np.zeros(self.num_envs, dtype=bool)
+
+        # Auto-reset finished, trapped and truncated copies
+        ended = dones | truncated
+        self.pos[ended] = self.start_cell
+        self.treats[ended] = self.all_treats
+        self.steps[ended] = 0
+        self.done = dones
+
+        info = {"tile": tile, "truncated": truncated}
+        return self.state_of_cell[self.pos], rewards, dones, info
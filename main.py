@@ -1,4 +1,5 @@
 import os
+import logging
 os.environ["SDL_VIDEO_CENTERED"] = "1"
 import pygame
 from env.gridworld_env import GridWorldEnv
@@ -93,4 +94,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Manual play shows the game messages (level complete, game over) on the console
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     main()
@@ -0,0 +1,143 @@
+"""
+Per-phase wall-time profiling for the training loops.
+
+A loop threads one timestamp through its phases and charges the time since the
+previous mark to each phase as it finishes:
+
+    t = profiler.now()
+    a = agent.select_action(s);    t = profiler.lap("action", t)
+    s2, r, done, _ = env.step(a);  t = profiler.lap("step", t)
+    ...
+    profiler.end_episode(episode, steps=steps, reward=total)
+
+Times come from time.perf_counter_ns. Pass NULL_PROFILER (the default in the
+training functions) when profiling is off: its methods do nothing, so the
+loops pay only a few no-op calls per step.
+"""
+import csv
+import json
+import time
+
+# Phases the training loops report, in display order
+PHASES = ("reset", "action", "step", "update", "render", "events", "delay")
+
+
+class PhaseProfiler:
+    """
+    Accumulates wall time (ns) and call counts per phase, per episode and per run.
+
+    print_every = print one episode's breakdown every N episodes (0 = never)
+    """
+
+    def __init__(self, print_every=0):
+        self.print_every = print_every
+        self.run_ns = dict.fromkeys(PHASES, 0)
+        self.run_calls = dict.fromkeys(PHASES, 0)
+        self._ns = dict.fromkeys(PHASES, 0)
+        self._calls = dict.fromkeys(PHASES, 0)
+        self.episodes = []  # one row per finished episode
+        self._start = time.perf_counter_ns()
+
+    # ----------------------------
+    # Timing
+    # ----------------------------
+    def now(self):
+        return time.perf_counter_ns()
+
+    def lap(self, phase, t):
+        """Charge the time since t to phase and return the new mark."""
+        now = time.perf_counter_ns()
+        self._ns[phase] += now - t
+        self._calls[phase] += 1
+        return now
+
+    def end_episode(self, episode, **extra):
+        """Close the current episode: store its row (plus extra columns) and fold it into the run."""
+        row = {"episode": episode, **extra}
+        for phase in PHASES:
+            row[f"{phase}_ns"] = self._ns[phase]
+            row[f"{phase}_calls"] = self._calls[phase]
+            self.run_ns[phase] += self._ns[phase]
+            self.run_calls[phase] += self._calls[phase]
+            self._ns[phase] = 0
+            self._calls[phase] = 0
+        self.episodes.append(row)
+        if self.print_every and len(self.episodes) % self.print_every == 0:
+            print(self.format_episode(row))
+
+    # ----------------------------
+    # Reporting
+    # ----------------------------
+    def summary(self):
+        """Per-run breakdown: {phase: {"ms", "calls", "mean_us", "percent"}} plus wall-clock totals."""
+        timed = sum(self.run_ns.values())
+        phases = {}
+        for phase in PHASES:
+            ns, calls = self.run_ns[phase], self.run_calls[phase]
+            phases[phase] = {
+                "ms": ns / 1e6,
+                "calls": calls,
+                "mean_us": ns / calls / 1e3 if calls else 0.0,
+                "percent": 100.0 * ns / timed if timed else 0.0,
+            }
+        return {
+            "episodes": len(self.episodes),
+            "timed_ms": timed / 1e6,
+            "wall_ms": (time.perf_counter_ns() - self._start) / 1e6,
+            "phases": phases,
+        }
+
+    def format_episode(self, row):
+        total = sum(row[f"{phase}_ns"] for phase in PHASES) or 1
+        parts = [f"{phase} {100.0 * row[f'{phase}_ns'] / total:4.1f}%"
+                 for phase in PHASES if row[f"{phase}_calls"]]
+        return f"[profile] ep {row['episode']:4d} | {total / 1e6:8.1f} ms | " + " ".join(parts)
+
+    def print_summary(self):
+        s = self.summary()
+        print(f"\nProfile: {s['episodes']} episodes, {s['timed_ms']:.1f} ms timed "
+              f"of {s['wall_ms']:.1f} ms wall")
+        print(f"{'phase':<8} {'ms':>10} {'calls':>10} {'mean us':>10} {'share':>7}")
+        for phase, p in s["phases"].items():
+            if p["calls"]:
+                print(f"{phase:<8} {p['ms']:>10.1f} {p['calls']:>10d} {p['mean_us']:>10.2f} {p['percent']:>6.1f}%")
+
+    def to_csv(self, path):
+        """One row per episode with <phase>_ns and <phase>_calls columns."""
+        if not self.episodes:
+            return
+        fields = list(self.episodes[0])
+        for row in self.episodes:
+            fields += [k for k in row if k not in fields]
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.episodes)
+
+    def to_json(self, path):
+        """The run summary and every episode row."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"run": self.summary(), "episodes": self.episodes}, f, indent=1)
+
+    def export(self, path):
+        """Write CSV or JSON depending on the file extension."""
+        if path.endswith(".csv"):
+            self.to_csv(path)
+        else:
+            self.to_json(path)
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off; every method is a no-op."""
+
+    def now(self):
+        return 0
+
+    def lap(self, phase, t):
+        return 0
+
+    def end_episode(self, episode, **extra):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
@@ -2,16 +2,28 @@
 
 import os
 os.environ["SDL_VIDEO_CENTERED"] = "1"
-from env.gridworld_env import GridWorldEnv
+from env.gridworld_env import GridWorldEnv, STATE_ENCODINGS
 from agent.qagent import QAgent
+from agent import make_agent, AGENT_TYPES
+from agent.rng import make_seed
+from agent.planning import plan_level_files
+from agent.checkpoint import save_q_table, load_q_table, save_checkpoint, load_checkpoint, restore_checkpoint
+from agent.model_archive import ModelArchive, check_table, compact_legacy_table
+from train import train_level, LEVEL_FILES
+from profiler import PhaseProfiler, NULL_PROFILER
 import pygame
 import numpy as np
 import argparse
+import logging
 import subprocess
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 EPISODE_LEVEL = None
 
+logger = logging.getLogger(__name__)
+
 #################### Level Background Music Functions #############################
 
 LEVEL_MUSIC = {
@@ -25,7 +37,7 @@ def play_level_music(level_index: int, volume: float = 0.5):
     """Load and loop the background music for the given level index."""
     filename = LEVEL_MUSIC.get(level_index)
     if not filename:
-        print(f"No music configured for level {level_index}")
+        logger.warning("No music configured for level %d", level_index)
         pygame.mixer.music.stop()
         return
 
@@ -34,9 +46,9 @@ def play_level_music(level_index: int, volume: float = 0.5):
         pygame.mixer.music.set_volume(volume)
         # Loop forever with a small fade-in
         pygame.mixer.music.play(-1, fade_ms=800)
-        print(f"Now playing music for level {level_index}: {filename}")
+        logger.info("Now playing music for level %d: %s", level_index, filename)
     except Exception as e:
-        print(f"Error loading music for level {level_index}: {e}")
+        logger.warning("Error loading music for level %d: %s", level_index, e)
         pygame.mixer.music.stop()
 
 ########################### Function to Run Manual Mode #############################
@@ -58,10 +70,73 @@ def run_manual_play():
     main()
 
 
+######################## Render Policy ######################################################
+
+class RenderPolicy:
+    """
+    Decides which training steps get drawn, so learning speed is not tied to display speed.
+
+    every = draw every Nth step of an episode, plus its last step (1 = every step)
+    episode_every = draw only the last step of every Kth episode (overrides every)
+    fps = draw at most this many frames per wall-clock second and train unthrottled
+          in between (overrides both, and delay is ignored)
+    delay = delay in milliseconds after each drawn frame
+
+    Window events are still polled after every drawn frame and at least every
+    POLL_INTERVAL seconds in between, so closing the window stops training even
+    while frames are being skipped.
+    """
+    POLL_INTERVAL = 0.1  # seconds
+
+    def __init__(self, every=1, episode_every=None, fps=None, delay=0):
+        if every < 1:
+            raise ValueError(f"render every must be >= 1, got {every}")
+        if episode_every is not None and episode_every < 1:
+            raise ValueError(f"render episode_every must be >= 1, got {episode_every}")
+        if fps is not None and fps <= 0:
+            raise ValueError(f"render fps must be > 0, got {fps}")
+        self.every = every
+        self.episode_every = episode_every
+        self.frame_time = 1.0 / fps if fps else None
+        self.delay = 0 if fps else delay
+        self._last_frame = float("-inf")
+        self._last_poll = time.perf_counter()
+
+    def should_render(self, step, episode, last_step):
+        """step and episode count from 1; last_step is True on the episode's final step."""
+        if self.frame_time is not None:
+            now = time.perf_counter()
+            if now - self._last_frame >= self.frame_time:
+                self._last_frame = now
+                return True
+            return False
+        if self.episode_every is not None:
+            return last_step and episode % self.episode_every == 0
+        return last_step or step % self.every == 0
+
+    def frame_drawn(self):
+        """Hold the frame on screen for the configured delay."""
+        if self.delay:
+            pygame.time.delay(self.delay)
+
+    def should_poll(self, rendered):
+        """True when the event queue should be drained this step."""
+        now = time.perf_counter()
+        if rendered or now - self._last_poll >= self.POLL_INTERVAL:
+            self._last_poll = now
+            return True
+        return False
+
+
 ######################## Training Modes #####################################################
 
 def train_by_completion(level=0, episodes=1000, alpha=0.9, gamma=0.9,
-          eps_start=1.0, eps_end=0.05, eps_decay=800, delay=1000):
+          eps_start=1.0, eps_end=0.05, eps_decay=800, delay=1000,
+          render_every=1, render_episode_every=None, render_fps=None,
+          profiler=NULL_PROFILER, replay_capacity=0, batch_size=32,
+          planning_steps=0, checkpoint_path=None, checkpoint_every=50, resume=False,
+          archive=None, state_encoding="cell", q_dtype="float64", seed=None,
+          agent_type="q", lam=0.9):
     """
     Train the pet until the level is completed.
     Save the q_table for each level at the end of training.
@@ -72,6 +147,19 @@ def train_by_completion(level=0, episodes=1000, alpha=0.9, gamma=0.9,
     eps_end = minimum epsilon (Even after lots of training, the pet will still make 5% random moves in this case)
     eps_decay = number of episodes to decay epsilon (higher = slower decay, here It will take ≈800 episodes to go from epsilon 1.0 → 0.05)
     delay = delay in milliseconds for rendering (0.1 seconds per step or higher recommended for visual clarity)
+    render_every / render_episode_every / render_fps = which steps are drawn, see RenderPolicy
+    profiler = PhaseProfiler that records where each step's time goes (see profiler.py)
+    replay_capacity = experience replay buffer size (0 = off), batch_size = transitions replayed per step
+    planning_steps = Dyna-Q simulated updates per real step (0 = plain Q-learning, see agent/dyna.py)
+    checkpoint_path = file to checkpoint the run to every checkpoint_every episodes and on window
+                      close (None = no checkpoints); resume = continue from that file if it exists
+    archive = also store each finished level's Q-table, with its settings, in this
+              ModelArchive directory (see agent/model_archive.py)
+    state_encoding = "cell_treats" makes the state (cell, treats left) with a sparse Q-table
+    q_dtype = Q-table dtype ("float32" halves its memory)
+    seed = run seed; each level's agent gets make_seed(seed, level) (None = seeded from `random`)
+    agent_type = "q" (Q-learning / Dyna-Q), or "qlambda" / "sarsa-lambda" to learn with
+                 eligibility traces decaying by lam (see agent/traces.py)
     """
     pygame.init()
     pygame.mixer.init()
@@ -85,7 +173,13 @@ def train_by_completion(level=0, episodes=1000, alpha=0.9, gamma=0.9,
     env = GridWorldEnv(
         level_files=["levels/level1.txt", "levels/level2.txt", "levels/level3.txt", "levels/level4.txt"],
         asset_dir="assets",
+        persistence="background",  # temp level file writes never block the step loop
+        state_encoding=state_encoding,
     )
+    checkpoint = None
+    if resume and checkpoint_path and os.path.exists(checkpoint_path):
+        checkpoint = load_checkpoint(checkpoint_path)
+        level = checkpoint[1]["level"]
     current_level = level
     env.reset(level)
 
@@ -104,14 +198,31 @@ def train_by_completion(level=0, episodes=1000, alpha=0.9, gamma=0.9,
     screen = pygame.display.set_mode((window_width, window_height))
     
     pygame.display.set_caption("TreatQuest: A Visual Training Demo")
-    agent = QAgent(env.num_states, env.num_actions, alpha=alpha, gamma=gamma,
-                   eps_start=eps_start, eps_end=eps_end, eps_decay_episodes=eps_decay, env=env)
+    agent = make_agent(env.num_states, env.num_actions, alpha=alpha, gamma=gamma,
+                       eps_start=eps_start, eps_end=eps_end, eps_decay_episodes=eps_decay, env=env,
+                       replay_capacity=replay_capacity, batch_size=batch_size,
+                       planning_steps=planning_steps, sparse=state_encoding != "cell",
+                       dtype=q_dtype, seed=make_seed(seed, level), agent_type=agent_type, lam=lam)
     
+    render = RenderPolicy(render_every, render_episode_every, render_fps, delay)
+    archive = ModelArchive(archive) if archive else None
+    hyperparams = dict(alpha=alpha, gamma=gamma, eps_start=eps_start, eps_end=eps_end,
+                       eps_decay=eps_decay, replay_capacity=replay_capacity,
+                       batch_size=batch_size, planning_steps=planning_steps,
+                       state_encoding=state_encoding, q_dtype=q_dtype, seed=seed,
+                       agent_type=agent_type, lam=lam)
     rewards = []
     episode = 0
+    if checkpoint is not None:
+        episode, level, rewards = restore_checkpoint(agent, *checkpoint)
+        print(f"Resumed from {checkpoint_path}: level {level}, episode {episode}")
+    level_start = episode  # episode count when the current level began
 
     while level < len(env.level_files):
+        t = profiler.now()
         env.reset(level)
+        agent.begin_episode()
+        t = profiler.lap("reset", t)
 
         pygame.mixer.music.stop()
         play_level_music(level, volume=0.5)
@@ -122,39 +233,60 @@ def train_by_completion(level=0, episodes=1000, alpha=0.9, gamma=0.9,
         steps = 0
         episode += 1
         while not done and steps < 500:
+            t = profiler.now()
             action = agent.select_action(current_state)
+            t = profiler.lap("action", t)
             next_state, reward, done, info = env.step(action)
+            t = profiler.lap("step", t)
             total_reward += reward
             steps += 1
             agent.update(current_state, action, reward, next_state, done)
             current_state = next_state
+            t = profiler.lap("update", t)
 
-            screen.fill((0, 0, 0))
-            env.render_pygame(screen)
-            env.render_ui(screen)
-            mode = "EXPLORE" if agent.epsilon > agent.eps_end else "EXPLOIT"
-            env.render_hud(
-                screen,
-                mode=mode,
-                episode=episode,
-                total_reward=total_reward,
-                epsilon=agent.epsilon
-            )
-            pygame.display.flip()
-            pygame.time.delay(delay)
+            rendered = render.should_render(steps, episode, done or steps >= 500)
+            if rendered:
+                # Only the cells/UI that changed are repainted and pushed to the display
+                mode = "EXPLORE" if agent.epsilon > agent.eps_end else "EXPLOIT"
+                dirty = env.render_frame(
+                    screen,
+                    mode=mode,
+                    episode=episode,
+                    total_reward=total_reward,
+                    epsilon=agent.epsilon
+                )
+                pygame.display.update(dirty)
+                t = profiler.lap("render", t)
+                render.frame_drawn()
+                t = profiler.lap("delay", t)
 
+            if not render.should_poll(rendered):
+                continue
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
-                    np.save(f"q_table_level{level}.npy", agent.Q)
+                    profiler.end_episode(episode, level=level, steps=steps, reward=total_reward)
+                    save_q_table(f"q_table_level{level}.npy", agent.Q)
+                    if checkpoint_path:
+                        # The interrupted episode is replayed from its start on --resume
+                        save_checkpoint(checkpoint_path, agent, episode - 1, level=level, returns=rewards)
+                    env.close()
                     pygame.mixer.music.stop()
                     pygame.quit()
                     print(f"Episode {episode} on level {level} finished with total reward {total_reward}")
                     #agent.print_Q()
                     return
+            profiler.lap("events", t)
+
+        profiler.end_episode(episode, level=level, steps=steps, reward=total_reward)
 
         # Completed Level #
-        if info["tile"] == "finished":
-            np.save(f"q_table_level{level}.npy", agent.Q)
+        level_done = info["tile"] == "finished"
+        if level_done:
+            save_q_table(f"q_table_level{level}.npy", agent.Q)
+            if archive is not None:
+                archive.add(level, agent.Q, env.level_files[level], hyperparams=hyperparams,
+                            episodes=episode - level_start, state_encoding=state_encoding)
+            level_start = episode
             print(f"Level {level} completed! Moving to next level.")
             level += 1
             if level < len(env.level_files): # Move to Next Level
@@ -163,11 +295,15 @@ def train_by_completion(level=0, episodes=1000, alpha=0.9, gamma=0.9,
                 current_state = env.get_state()
                 
                 screen = pygame.display.set_mode(env.get_window_size())
-                agent = QAgent(env.num_states, env.num_actions, alpha=alpha, gamma=gamma,
-                            eps_start=eps_start, eps_end=eps_end, eps_decay_episodes=eps_decay, env=env)
+                agent = make_agent(env.num_states, env.num_actions, alpha=alpha, gamma=gamma,
+                            eps_start=eps_start, eps_end=eps_end, eps_decay_episodes=eps_decay, env=env,
+                            replay_capacity=replay_capacity, batch_size=batch_size,
+                            planning_steps=planning_steps, sparse=state_encoding != "cell",
+                            dtype=q_dtype, seed=make_seed(seed, level), agent_type=agent_type, lam=lam)
             else:
                 print("All levels completed!\nCongrats!") # All Levels Done
                 #agent.print_Q()
+                env.close()
                 pygame.mixer.music.stop()
                 pygame.quit()
                 return
@@ -177,18 +313,27 @@ def train_by_completion(level=0, episodes=1000, alpha=0.9, gamma=0.9,
 
         agent.decay_epsilon(episode)
         rewards.append(total_reward)
+        if checkpoint_path and (level_done or (checkpoint_every and episode % checkpoint_every == 0)):
+            save_checkpoint(checkpoint_path, agent, episode, level=level, returns=rewards)
 
-    np.save(f"q_table_level{level}.npy", agent.Q)
+    save_q_table(f"q_table_level{level}.npy", agent.Q)
+    env.close()
     pygame.mixer.music.stop()
     pygame.quit()
     print("Training was Successful!\n Thank you for watching! >^.^<")
 
 
 def train_by_episode(level=0, episodes=15, alpha=0.9, gamma=0.9, 
-                      eps_start=1.0, eps_end=0.05, eps_decay=800, delay=1):
+                      eps_start=1.0, eps_end=0.05, eps_decay=800, delay=1, levels=None,
+                      render_every=1, render_episode_every=None, render_fps=None,
+                      profiler=NULL_PROFILER, replay_capacity=0, batch_size=32,
+                      planning_steps=0, checkpoint_path=None, checkpoint_every=50, resume=False,
+                      archive=None, state_encoding="cell", q_dtype="float64", seed=None,
+                      agent_type="q", lam=0.9):
     """
     Train the pet for a fixed number of episodes.
     Save the q_table for each level at the end of training.
+    levels = level indices to train (defaults to `level` through the last level)
 
     alpha = learning rate (How fast does the agent update the Q-values?)
     gamma = discount factor (How much does the agent value future rewards? 0-1 = none to high)
@@ -196,6 +341,19 @@ def train_by_episode(level=0, episodes=15, alpha=0.9, gamma=0.9,
     eps_end = minimum epsilon (Even after lots of training, the pet will still make 5% random moves in this case)
     eps_decay = number of episodes to decay epsilon (higher = slower decay, here It will take ≈800 episodes to go from epsilon 1.0 → 0.05)
     delay = delay in milliseconds for rendering (0.1 seconds per step or higher recommended for visual clarity)
+    render_every / render_episode_every / render_fps = which steps are drawn, see RenderPolicy
+    profiler = PhaseProfiler that records where each step's time goes (see profiler.py)
+    replay_capacity = experience replay buffer size (0 = off), batch_size = transitions replayed per step
+    planning_steps = Dyna-Q simulated updates per real step (0 = plain Q-learning, see agent/dyna.py)
+    checkpoint_path = file to checkpoint the run to every checkpoint_every episodes and on window
+                      close (None = no checkpoints); resume = continue from that file if it exists
+    archive = also store each finished level's Q-table, with its settings, in this
+              ModelArchive directory (see agent/model_archive.py)
+    state_encoding = "cell_treats" makes the state (cell, treats left) with a sparse Q-table
+    q_dtype = Q-table dtype ("float32" halves its memory)
+    seed = run seed; each level's agent gets make_seed(seed, level) (None = seeded from `random`)
+    agent_type = "q" (Q-learning / Dyna-Q), or "qlambda" / "sarsa-lambda" to learn with
+                 eligibility traces decaying by lam (see agent/traces.py)
     """
     pygame.init()
     pygame.mixer.init()
@@ -209,6 +367,8 @@ def train_by_episode(level=0, episodes=15, alpha=0.9, gamma=0.9,
     env = GridWorldEnv(
         level_files=["levels/level1.txt", "levels/level2.txt", "levels/level3.txt", "levels/level4.txt"],
         asset_dir="assets",
+        persistence="background",  # temp level file writes never block the step loop
+        state_encoding=state_encoding,
     )
     current_level = level
     env.reset(level)
@@ -228,71 +388,185 @@ def train_by_episode(level=0, episodes=15, alpha=0.9, gamma=0.9,
     screen = pygame.display.set_mode((window_width, window_height))
     
     pygame.display.set_caption("TreatQuest: A Visual Training Demo")
-    agent = QAgent(env.num_states, env.num_actions, alpha=alpha, gamma=gamma,
-                   eps_start=eps_start, eps_end=eps_end, eps_decay_episodes=eps_decay, env=env)
+    agent = make_agent(env.num_states, env.num_actions, alpha=alpha, gamma=gamma,
+                       eps_start=eps_start, eps_end=eps_end, eps_decay_episodes=eps_decay, env=env,
+                       replay_capacity=replay_capacity, batch_size=batch_size,
+                       planning_steps=planning_steps, sparse=state_encoding != "cell",
+                       dtype=q_dtype, seed=make_seed(seed, level), agent_type=agent_type, lam=lam)
     
-    for lev in range(level, len(env.level_files)):
+    render = RenderPolicy(render_every, render_episode_every, render_fps, delay)
+    archive = ModelArchive(archive) if archive else None
+    hyperparams = dict(alpha=alpha, gamma=gamma, eps_start=eps_start, eps_end=eps_end,
+                       eps_decay=eps_decay, replay_capacity=replay_capacity,
+                       batch_size=batch_size, planning_steps=planning_steps,
+                       state_encoding=state_encoding, q_dtype=q_dtype, seed=seed,
+                       agent_type=agent_type, lam=lam)
+    if levels is None:
+        levels = range(level, len(env.level_files))
+    levels = list(levels)
+
+    checkpoint = None
+    if resume and checkpoint_path and os.path.exists(checkpoint_path):
+        checkpoint = load_checkpoint(checkpoint_path)
+        resume_level = checkpoint[1]["level"]
+        if resume_level not in levels:
+            raise ValueError(f"{checkpoint_path} is for level {resume_level}, not one of {levels}")
+        levels = levels[levels.index(resume_level):]  # earlier levels already saved their Q-tables
+
+    for lev in levels:
         env.reset(lev)
 
         pygame.mixer.music.stop()
-        play_level_music(level, volume=0.5)
+        play_level_music(lev, volume=0.5)
 
         screen = pygame.display.set_mode(env.get_window_size())
-        agent = QAgent(env.num_states, env.num_actions, alpha=alpha, gamma=gamma,
-                        eps_start=eps_start, eps_end=eps_end, eps_decay_episodes=eps_decay, env=env)
+        agent = make_agent(env.num_states, env.num_actions, alpha=alpha, gamma=gamma,
+                        eps_start=eps_start, eps_end=eps_end, eps_decay_episodes=eps_decay, env=env,
+                        replay_capacity=replay_capacity, batch_size=batch_size,
+                        planning_steps=planning_steps, sparse=state_encoding != "cell",
+                        dtype=q_dtype, seed=make_seed(seed, lev), agent_type=agent_type, lam=lam)
         rewards = []
-        for ep in range(episodes):
+        start_episode = 0
+        if checkpoint is not None:
+            start_episode, _, rewards = restore_checkpoint(agent, *checkpoint)
+            checkpoint = None
+            print(f"Resumed from {checkpoint_path}: level {lev}, episode {start_episode}")
+        for ep in range(start_episode, episodes):
+            t = profiler.now()
             env.reset(lev)
+            agent.begin_episode()
             current_state = env.get_state()
             done = False
             total_reward = 0
             steps = 0
+            t = profiler.lap("reset", t)
 
             while not done and steps < 500:
+                t = profiler.now()
                 action = agent.select_action(current_state)
+                t = profiler.lap("action", t)
                 next_state, reward, done, info = env.step(action)
+                t = profiler.lap("step", t)
                 agent.update(current_state, action, reward, next_state, done)
                 current_state = next_state
                 total_reward += reward
                 steps += 1
-
-                screen.fill((0, 0, 0))
-                env.render_pygame(screen)
-                env.render_ui(screen)
-                mode = "EXPLORE" if agent.epsilon > agent.eps_end else "EXPLOIT"
-                env.render_hud(
-                    screen,
-                    mode=mode,
-                    episode=ep + 1,
-                    total_reward=total_reward,
-                    epsilon=agent.epsilon
-                )
-                pygame.display.flip()
-                pygame.time.delay(delay)
-
+                t = profiler.lap("update", t)
+
+                rendered = render.should_render(steps, ep + 1, done or steps >= 500)
+                if rendered:
+                    # Only the cells/UI that changed are repainted and pushed to the display
+                    mode = "EXPLORE" if agent.epsilon > agent.eps_end else "EXPLOIT"
+                    dirty = env.render_frame(
+                        screen,
+                        mode=mode,
+                        episode=ep + 1,
+                        total_reward=total_reward,
+                        epsilon=agent.epsilon
+                    )
+                    pygame.display.update(dirty)
+                    t = profiler.lap("render", t)
+                    render.frame_drawn()
+                    t = profiler.lap("delay", t)
+
+                if not render.should_poll(rendered):
+                    continue
                 for event in pygame.event.get():
                     if event.type == pygame.QUIT:
+                        profiler.end_episode(ep + 1, level=lev, steps=steps, reward=total_reward)
+                        env.close()
                         pygame.mixer.music.stop()
                         pygame.quit()
-                        np.save(f"q_table_level{level}.npy", agent.Q)
+                        save_q_table(f"q_table_level{lev}.npy", agent.Q)
+                        if checkpoint_path:
+                            # The interrupted episode is replayed from its start on --resume
+                            save_checkpoint(checkpoint_path, agent, ep, level=lev, returns=rewards)
                         print("Training interrupted. Q-table saved.")
                         #agent.print_Q()
                         return
+                profiler.lap("events", t)
 
             agent.decay_epsilon(ep + 1)
             rewards.append(total_reward)
+            profiler.end_episode(ep + 1, level=lev, steps=steps, reward=total_reward)
+            if checkpoint_path and checkpoint_every and (ep + 1) % checkpoint_every == 0:
+                save_checkpoint(checkpoint_path, agent, ep + 1, level=lev, returns=rewards)
 
             if (ep + 1) % 50 == 0:
                 print(f"Ep {ep+1:4d} | return={total_reward:6.2f} | eps={agent.epsilon:.2f}")
         
-        np.save(f"q_table_level{level}.npy", agent.Q)
-        print(f"Training finished. Q-table saved for level {level}.")
+        save_q_table(f"q_table_level{lev}.npy", agent.Q)
+        if archive is not None:
+            archive.add(lev, agent.Q, env.level_files[lev], hyperparams=hyperparams, episodes=episodes,
+                        state_encoding=state_encoding)
+        print(f"Training finished. Q-table saved for level {lev}.")
+    env.close()
     pygame.mixer.music.stop()
     pygame.quit()
     
 
 
-def run_visual(level=0, delay=100):
+def train_all_levels(episodes=1000, alpha=0.9, gamma=0.9, eps_start=1.0, eps_end=0.05,
+                     eps_decay=800, view_level=None, delay=1, workers=None,
+                     render_every=1, render_episode_every=None, render_fps=None,
+                     profiler=NULL_PROFILER, replay_capacity=0, batch_size=32, planning_steps=0,
+                     archive=None, state_encoding="cell", q_dtype="float64", seed=None,
+                     agent_type="q", lam=0.9):
+    """
+    Train every level at the same time, one headless worker process per level.
+    Each worker builds its own env and agent and writes its own q_table_level{N}.npy,
+    so wall-clock time is the slowest level instead of the sum of all levels.
+
+    view_level = level to train in this process with the usual live view instead
+                 of in a worker (None = no window at all)
+    render_every / render_episode_every / render_fps / profiler = passed on to that view
+    replay_capacity / batch_size / planning_steps = replay and Dyna-Q settings for every level
+    archive = ModelArchive directory to also store every level's Q-table in
+    state_encoding = "cell" or "cell_treats" (sparse (cell, treats left) states) for every level
+    q_dtype = Q-table dtype for every level
+    agent_type / lam = learning agent for every level (see train_by_episode)
+    seed = run seed; level N (worker or view) trains with make_seed(seed, N), so a
+           parallel run is reproducible whatever order the workers finish in
+    """
+    level_count = len(LEVEL_FILES)
+    hyper = dict(episodes=episodes, alpha=alpha, gamma=gamma,
+                 eps_start=eps_start, eps_end=eps_end, eps_decay=eps_decay,
+                 replay_capacity=replay_capacity, batch_size=batch_size,
+                 planning_steps=planning_steps, state_encoding=state_encoding, q_dtype=q_dtype,
+                 agent_type=agent_type, lam=lam)
+
+    # Start the workers before pygame so they never inherit SDL state
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(train_level, lev, seed=make_seed(seed, lev), **hyper)
+                   for lev in range(level_count) if lev != view_level]
+
+        if view_level is not None:
+            train_by_episode(level=view_level, delay=delay, levels=[view_level],
+                             render_every=render_every, render_episode_every=render_episode_every,
+                             render_fps=render_fps, profiler=profiler, archive=archive, seed=seed,
+                             **hyper)
+
+        # Only this process writes the manifest, so workers never race on it
+        store = ModelArchive(archive) if archive else None
+        settings = {k: v for k, v in hyper.items() if k != "episodes"}
+        for future in futures:
+            lev, path, returns = future.result()
+            print(f"Level {lev} trained for {len(returns)} episodes "
+                  f"(last return {returns[-1]:.1f}). Q-table saved to {path}")
+            if store is not None:
+                store.add(lev, load_q_table(path), LEVEL_FILES[lev], hyperparams=settings, episodes=episodes,
+                          state_encoding=state_encoding)
+    print("All levels trained!")
+
+
+def run_visual(level=0, delay=100, archive=None, state_encoding="cell"):
+    """
+    Replay trained Q-tables level by level, starting at `level`.
+    Tables come from q_table_level{N}.npy (.npz for sparse cell_treats tables), or
+    from a ModelArchive directory if archive is given; either way they are checked
+    against the level first.
+    state_encoding = encoding the tables were trained with
+    """
     pygame.init()
     pygame.mixer.init()
 
@@ -304,11 +578,13 @@ def run_visual(level=0, delay=100):
     env = GridWorldEnv(
         level_files=["levels/level1.txt", "levels/level2.txt", "levels/level3.txt", "levels/level4.txt"],
         asset_dir="assets",
+        state_encoding=state_encoding,
     )
     
     # Helpers to find next coordinates based on action index
     # ACTIONS = ["UP", "DOWN", "LEFT", "RIGHT"]
     action_deltas = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    archive = ModelArchive(archive) if archive else None
 
     for lev in range(level, len(env.level_files)):
         env.reset(lev)
@@ -331,14 +607,28 @@ def run_visual(level=0, delay=100):
        
        
         agent = QAgent(env.num_states, env.num_actions, alpha=0.5, gamma=0.9, 
-                            eps_start=0.0, eps_end=0.0, env=env)
+                            eps_start=0.0, eps_end=0.0, env=env, sparse=state_encoding != "cell")
 
         try:
-            loaded_table = np.load(f"q_table_level{lev}.npy")
+            if archive is not None:
+                # Copy-on-write map: the run below adjusts Q without touching the archive
+                loaded_table = archive.load(lev, env=env, mmap_mode="c")
+            else:
+                # Trained cell_treats tables are sparse .npz files (planned ones are .npy,
+                # which load_q_table falls back to); tables saved before state
+                # compaction have a row per grid cell
+                path = f"q_table_level{lev}.npz" if state_encoding != "cell" else f"q_table_level{lev}.npy"
+                loaded_table = compact_legacy_table(load_q_table(path), env.level,
+                                                    env.num_states // len(env.cell_of_state))
+                check_table(loaded_table, env, name=path)
             agent.Q = loaded_table 
             print(f"Loaded Q-table for Level {lev}")
-        except FileNotFoundError:
-            print(f"Missing q_table_level{lev}.npy! Train first before running.")
+        except (FileNotFoundError, KeyError):
+            print(f"Missing Q-table for level {lev}! Train first before running.")
+            pygame.quit()
+            return
+        except ValueError as e:
+            print(f"{e}. Retrain this level before running.")
             pygame.quit()
             return
         
@@ -370,9 +660,9 @@ def run_visual(level=0, delay=100):
                     real_reward = -5
             
         
-            next_state_idx = nr * grid_cols + nc
-            if not (0 <= nr < grid_rows and 0 <= nc < grid_cols):
-                next_state_idx = current_state # Boundary check (stay same)
+            next_state_idx = env.state_at(nr, nc)
+            if next_state_idx is None:
+                next_state_idx = current_state # Walls and the map edge keep the pet in place
 
           
             current_q_value = agent.Q[current_state, action]
@@ -401,11 +691,8 @@ def run_visual(level=0, delay=100):
             current_state = next_state
 
             # Render
-            screen.fill((0, 0, 0))
-            env.render_pygame(screen)
-            env.render_ui(screen)
-            env.render_hud(screen, mode="REALITY CHECK", total_reward=total_reward, epsilon=agent.epsilon)
-            pygame.display.flip()
+            dirty = env.render_frame(screen, mode="REALITY CHECK", total_reward=total_reward, epsilon=agent.epsilon)
+            pygame.display.update(dirty)
             pygame.time.delay(delay)
 
             for event in pygame.event.get():
@@ -857,12 +1144,100 @@ def show_menu():
 
 
 
+def report_profile(profiler, out_path=None):
+    """Print the run's phase breakdown and optionally save it (no-op when profiling is off)."""
+    if profiler is NULL_PROFILER:
+        return
+    profiler.print_summary()
+    if out_path:
+        profiler.export(out_path)
+        print(f"Saved profile to {out_path}")
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--level", type=int, default=0)
     parser.add_argument("--episodes", type=int, default=1000)
     parser.add_argument("--delay", type=int, default=50)
+    parser.add_argument("--plan", action="store_true",
+                        help="solve every level with value iteration and save the Q-tables (no window)")
+    parser.add_argument("--gamma", type=float, default=0.9, help="discount factor used by --plan")
+    parser.add_argument("--parallel", action="store_true",
+                        help="train all levels at once in worker processes")
+    parser.add_argument("--view-level", type=int, default=None,
+                        help="with --parallel: level to watch live while the others train headless")
+    parser.add_argument("--render-every", type=int, default=1,
+                        help="training: draw every Nth step (plus each episode's last step)")
+    parser.add_argument("--render-episode-every", type=int, default=None,
+                        help="training: draw only the last step of every Kth episode")
+    parser.add_argument("--render-fps", type=float, default=None,
+                        help="training: draw at most this many frames per second and train flat out in between")
+    parser.add_argument("--profile", action="store_true",
+                        help="training: time each phase (action/step/update/render/events/delay) and print a breakdown")
+    parser.add_argument("--profile-every", type=int, default=0,
+                        help="with --profile: also print every Nth episode's breakdown")
+    parser.add_argument("--profile-out", default=None,
+                        help="with --profile: save per-episode and run totals as .csv or .json")
+    parser.add_argument("--replay", type=int, default=0,
+                        help="training: experience replay buffer capacity (0 = plain Q-learning)")
+    parser.add_argument("--batch-size", type=int, default=32, help="with --replay: transitions replayed per step")
+    parser.add_argument("--planning-steps", type=int, default=0,
+                        help="training: Dyna-Q simulated updates per real step (0 = plain Q-learning)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="training: checkpoint file (Q-table, epsilon, episode, RNG state); off unless given")
+    parser.add_argument("--checkpoint-every", type=int, default=50,
+                        help="training: episodes between checkpoints (0 = only on window close)")
+    parser.add_argument("--resume", action="store_true",
+                        help="training: continue from --checkpoint instead of starting over")
+    parser.add_argument("--state-encoding", default="cell", choices=STATE_ENCODINGS,
+                        help="training/--plan/visual run: cell_treats = state is (cell, treats left), stored in a sparse "
+                             "Q-table; lets the pet tell apart visits to a cell with different treats left")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="training: run seed; level N's agent uses a seed derived from (seed, N), "
+                             "so runs (and --parallel workers) are reproducible")
+    parser.add_argument("--float32", action="store_true",
+                        help="training: keep Q-tables in float32 (half the memory of float64)")
+    parser.add_argument("--archive", default=None,
+                        help="Q-table archive directory to save trained/planned tables into and "
+                             "for the visual run to load from (see agent/model_archive.py)")
+    parser.add_argument("--agent", default="q", choices=sorted(AGENT_TYPES),
+                        help="training: q = Q-learning (Dyna-Q with --planning-steps); qlambda / "
+                             "sarsa-lambda learn with eligibility traces (see agent/traces.py)")
+    parser.add_argument("--lam", type=float, default=0.9,
+                        help="training with a trace agent: trace decay lambda (0 = one-step)")
+    parser.add_argument("--log-level", default="WARNING",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="env/game messages to show (INFO = level complete/game over, DEBUG = map dumps)")
     args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint PATH")
+    logging.basicConfig(level=args.log_level, format="%(levelname)s %(name)s: %(message)s")
+    profiler = PhaseProfiler(print_every=args.profile_every) if args.profile else NULL_PROFILER
+    render = dict(render_every=args.render_every, render_episode_every=args.render_episode_every,
+                  render_fps=args.render_fps, profiler=profiler)
+    learning = dict(replay_capacity=args.replay, batch_size=args.batch_size,
+                    planning_steps=args.planning_steps, state_encoding=args.state_encoding,
+                    q_dtype="float32" if args.float32 else "float64", seed=args.seed,
+                    agent_type=args.agent, lam=args.lam)
+    checkpointing = dict(checkpoint_path=args.checkpoint, checkpoint_every=args.checkpoint_every,
+                         resume=args.resume)
+
+    if args.parallel:
+        print("\n▶ Starting PARALLEL TRAINING of all levels...\n")
+        train_all_levels(episodes=args.episodes, view_level=args.view_level, delay=args.delay,
+                         archive=args.archive, **render, **learning)
+        report_profile(profiler, args.profile_out)
+        return
+
+    if args.plan:
+        print("\n▶ Planning Q-tables with value iteration...\n")
+        plan_level_files(
+            ["levels/level1.txt", "levels/level2.txt", "levels/level3.txt", "levels/level4.txt"],
+            gamma=args.gamma,
+            archive=args.archive,
+            state_encoding=args.state_encoding,
+        )
+        return
 
     choice = show_menu()
 
@@ -871,22 +1246,34 @@ def main():
         train_by_completion(
             level=args.level,
             episodes=args.episodes,
-            delay=args.delay
+            delay=args.delay,
+            **render,
+            **learning,
+            **checkpointing,
+            archive=args.archive
         )
+        report_profile(profiler, args.profile_out)
 
     elif choice == "2":
         print("\n▶ Starting TRAIN BY EPISODE...\n")
         train_by_episode(
             level=EPISODE_LEVEL,        # ← Use the stored level
             episodes=args.episodes,
-            delay=args.delay
+            delay=args.delay,
+            **render,
+            **learning,
+            **checkpointing,
+            archive=args.archive
         )
+        report_profile(profiler, args.profile_out)
 
     elif choice == "3":
         print("\n▶ Starting VISUAL RUN...\n")
         run_visual(
             level=args.level,
-            delay=args.delay
+            delay=args.delay,
+            archive=args.archive,
+            state_encoding=args.state_encoding
         )
     elif choice == "4":
         run_manual_play()
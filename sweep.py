@@ -0,0 +1,135 @@
+"""
+Hyperparameter sweep for headless Q-learning.
+
+Fans training runs for every (alpha, gamma, epsilon schedule, level, repeat)
+combination out over a process pool and collects the return curves and
+greedy success rates into one JSON file.
+
+Examples:
+    python sweep.py --levels 0 1 --alpha 0.1 0.5 0.9 --gamma 0.9 0.95 --eps-decay 300 800
+    python sweep.py --samples 64 --alpha 0.05 0.9 --gamma 0.8 0.99 --repeats 3
+"""
+import os
+import json
+import time
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from agent.qagent import QAgent
+from agent.rng import make_seed
+from train import make_headless_env, train_agent, evaluate_greedy
+
+HYPERPARAMS = ("alpha", "gamma", "eps_start", "eps_end", "eps_decay")
+
+
+def run_config(config):
+    """Train one agent headless for config (a dict) and return its results. Runs in a worker."""
+    env = make_headless_env()
+    env.reset(config["level"])
+    agent = QAgent(env.num_states, env.num_actions, alpha=config["alpha"], gamma=config["gamma"],
+                   eps_start=config["eps_start"], eps_end=config["eps_end"],
+                   eps_decay_episodes=config["eps_decay"], seed=config["seed"])
+
+    start = time.perf_counter()
+    returns = train_agent(env, agent, config["level"], config["episodes"], log_every=0)
+    success_rate, greedy_return = evaluate_greedy(env, agent, config["level"],
+                                                  episodes=config["eval_episodes"])
+    return {
+        **config,
+        "returns": returns,
+        "greedy_success_rate": success_rate,
+        "greedy_return": greedy_return,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def grid_configs(space):
+    """Every combination of the listed values."""
+    for values in itertools.product(*(space[k] for k in HYPERPARAMS)):
+        yield dict(zip(HYPERPARAMS, values))
+
+
+def sampled_configs(space, samples, rng):
+    """samples random configs, each value drawn uniformly between the min and max listed."""
+    for _ in range(samples):
+        config = {}
+        for k in HYPERPARAMS:
+            lo, hi = min(space[k]), max(space[k])
+            config[k] = rng.randint(lo, hi) if isinstance(lo, int) else rng.uniform(lo, hi)
+        yield config
+
+
+def build_runs(args):
+    space = {
+        "alpha": args.alpha,
+        "gamma": args.gamma,
+        "eps_start": args.eps_start,
+        "eps_end": args.eps_end,
+        "eps_decay": args.eps_decay,
+    }
+    rng = random.Random(args.seed)
+    configs = sampled_configs(space, args.samples, rng) if args.samples else grid_configs(space)
+
+    runs = []
+    for config_index, config in enumerate(configs):
+        for level in args.levels:
+            for repeat in range(args.repeats):
+                runs.append({
+                    **config,
+                    "level": level,
+                    "repeat": repeat,
+                    "episodes": args.episodes,
+                    "eval_episodes": args.eval_episodes,
+                    # Fixed by the run's place in the sweep, not by which worker picks it up
+                    "seed": make_seed(args.seed, config_index, level, repeat),
+                })
+    return runs
+
+
+def sweep(runs, workers=None):
+    """Run every config in a process pool; returns results in submission order."""
+    results = [None] * len(runs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_config, run): i for i, run in enumerate(runs)}
+        for done_count, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            results[i] = future.result()
+            r = results[i]
+            print(f"[{done_count}/{len(runs)}] level={r['level']} alpha={r['alpha']:.3g} "
+                  f"gamma={r['gamma']:.3g} eps_decay={r['eps_decay']} "
+                  f"success={r['greedy_success_rate']:.2f} ({r['seconds']:.1f}s)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel Q-learning hyperparameter sweep")
+    parser.add_argument("--levels", type=int, nargs="+", default=[0])
+    parser.add_argument("--alpha", type=float, nargs="+", default=[0.1, 0.5, 0.9])
+    parser.add_argument("--gamma", type=float, nargs="+", default=[0.9, 0.95])
+    parser.add_argument("--eps-start", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--eps-end", type=float, nargs="+", default=[0.05])
+    parser.add_argument("--eps-decay", type=int, nargs="+", default=[500, 800])
+    parser.add_argument("--samples", type=int, default=0,
+                        help="draw this many random configs within each value range instead of the full grid")
+    parser.add_argument("--repeats", type=int, default=1, help="runs per config with different seeds")
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--eval-episodes", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="sweep_results.json")
+    args = parser.parse_args()
+
+    runs = build_runs(args)
+    print(f"Sweeping {len(runs)} runs on {args.workers or os.cpu_count()} workers...")
+    start = time.perf_counter()
+    results = sweep(runs, workers=args.workers)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"args": vars(args), "runs": results}, f)
+    print(f"Saved {len(results)} runs to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,178 @@
+import os
 import argparse
-import pygame
-import matplotlib.pyplot as plt
-from env.gridworld_env import GridWorldEnv
-from agent.qagent import QAgent
+import logging
+from env.gridworld_env import GridWorldEnv, STATE_ENCODINGS
+from agent import make_agent, AGENT_TYPES
+from agent.rng import make_seed
+from agent.checkpoint import save_q_table, save_checkpoint, load_checkpoint, restore_checkpoint
+from profiler import PhaseProfiler, NULL_PROFILER
 
-def train(level=0, episodes=1000, alpha=0.1, gamma=0.95,
-          eps_start=1.0, eps_end=0.05, eps_decay=800):
+LEVEL_FILES = ["levels/level1.txt", "levels/level2.txt", "levels/level3.txt", "levels/level4.txt"]
 
-    # Tiny hidden window so pygame image loads don't crash
-    pygame.init()
-    pygame.display.set_mode((1,1))
 
-    env = GridWorldEnv(
-        level_files=["levels/level1.txt", "levels/level2.txt", "levels/level3.txt"],
-        asset_dir="assets"
+def make_headless_env(level_files=LEVEL_FILES, state_encoding="cell"):
+    """Headless env: no pygame, no window, no audio device, no temp file writes."""
+    return GridWorldEnv(
+        level_files=level_files,
+        asset_dir="assets",
+        headless=True,
+        persistence="off",
+        state_encoding=state_encoding,
     )
-    _ = env.reset(level)
-    agent = QAgent(env.num_states, env.num_actions, alpha=alpha, gamma=gamma,
-                   eps_start=eps_start, eps_end=eps_end, eps_decay_episodes=eps_decay)
 
-    rewards = []
-    for ep in range(episodes):
+
+def train_agent(env, agent, level, episodes, max_steps=500, log_every=50, profiler=NULL_PROFILER,
+                checkpoint_path=None, checkpoint_every=100, resume=False):
+    """
+    Run epsilon-greedy Q-learning episodes on one level and return the list of
+    per-episode returns. Set log_every=0 to train silently.
+    profiler = PhaseProfiler to record reset/action/step/update time in
+    checkpoint_path = file to checkpoint to every checkpoint_every episodes (None = off);
+                      with resume, an existing checkpoint is continued from exactly
+    """
+    rewards, start = [], 0
+    if resume and checkpoint_path and os.path.exists(checkpoint_path):
+        start, ckpt_level, rewards = restore_checkpoint(agent, *load_checkpoint(checkpoint_path))
+        if ckpt_level != level:
+            raise ValueError(f"{checkpoint_path} is for level {ckpt_level}, not level {level}")
+        print(f"Resumed from {checkpoint_path} at episode {start}")
+    for ep in range(start, episodes):
+        t = profiler.now()
         env.reset(level)
+        agent.begin_episode()
         s = env.get_state()  # <-- get integer state index
         done, total, steps = False, 0.0, 0
+        t = profiler.lap("reset", t)
 
-        while not done and steps < 500:
+        while not done and steps < max_steps:
             a = agent.select_action(s)
+            t = profiler.lap("action", t)
             s2, r, done, _ = env.step(a) # Results for new state
+            t = profiler.lap("step", t)
             agent.update(s, a, r, s2, done) # Updating Q-table
+            t = profiler.lap("update", t)
             s = s2
             total += r
             steps += 1
 
         agent.decay_epsilon(ep + 1)
         rewards.append(total)
-        if (ep + 1) % 50 == 0:
+        profiler.end_episode(ep + 1, level=level, steps=steps, reward=total)
+        if checkpoint_path and checkpoint_every and (ep + 1) % checkpoint_every == 0:
+            save_checkpoint(checkpoint_path, agent, ep + 1, level=level, returns=rewards)
+        if log_every and (ep + 1) % log_every == 0:
             print(f"Ep {ep+1:4d} | return={total:6.2f} | eps={agent.epsilon:.2f}")
+    return rewards
+
+
+def evaluate_greedy(env, agent, level, episodes=1, max_steps=500):
+    """
+    Play the agent's greedy policy (no exploration, no learning).
+    Returns (success_rate, mean_return); success means the level was finished.
+    """
+    successes, returns = 0, []
+    for _ in range(episodes):
+        env.reset(level)
+        s = env.get_state()
+        done, total, steps, tile = False, 0.0, 0, None
+        while not done and steps < max_steps:
+            s, r, done, info = env.step(int(agent.Q[s].argmax()))
+            tile = info["tile"]
+            total += r
+            steps += 1
+        successes += tile == "finished"
+        returns.append(total)
+    return successes / episodes, sum(returns) / episodes
+
+
+def train_level(level, episodes=1000, alpha=0.9, gamma=0.9, eps_start=1.0, eps_end=0.05,
+                eps_decay=800, out_path=None, replay_capacity=0, batch_size=32,
+                planning_steps=0, state_encoding="cell", q_dtype="float64", seed=None,
+                agent_type="q", lam=0.9):
+    """
+    Train a fresh agent on one level headless and save its Q-table.
+    Self-contained so it can run in its own worker process.
+    state_encoding = "cell_treats" trains on (cell, treats left) states with a sparse Q-table
+    q_dtype = Q-table dtype ("float32" halves its memory)
+    seed = the agent's seed (train_all_levels passes make_seed(run seed, level))
+    agent_type / lam = "q", or "qlambda" / "sarsa-lambda" with trace decay lam (agent/traces.py)
+
+    Returns (level, out_path, returns).
+    """
+    env = make_headless_env(state_encoding=state_encoding)
+    env.reset(level)
+    agent = make_agent(env.num_states, env.num_actions, alpha=alpha, gamma=gamma,
+                       eps_start=eps_start, eps_end=eps_end, eps_decay_episodes=eps_decay,
+                       replay_capacity=replay_capacity, batch_size=batch_size,
+                       planning_steps=planning_steps, sparse=state_encoding != "cell",
+                       dtype=q_dtype, seed=seed, agent_type=agent_type, lam=lam)
+    returns = train_agent(env, agent, level, episodes, log_every=0)
+
+    # A sparse table is written as .npz (its stored rows only); out_path is the file written
+    out_path = save_q_table(out_path or f"q_table_level{level}.npy", agent.Q)
+    return level, out_path, returns
+
+
+def train(level=0, episodes=1000, alpha=0.1, gamma=0.95,
+          eps_start=1.0, eps_end=0.05, eps_decay=800, profiler=NULL_PROFILER,
+          replay_capacity=0, batch_size=32, planning_steps=0,
+          checkpoint_path=None, checkpoint_every=100, resume=False, state_encoding="cell",
+          q_dtype="float64", seed=None, agent_type="q", lam=0.9):
+    import matplotlib.pyplot as plt  # only needed for the progress plot
+
+    env = make_headless_env(state_encoding=state_encoding)
+    _ = env.reset(level)
+    agent = make_agent(env.num_states, env.num_actions, alpha=alpha, gamma=gamma,
+                       eps_start=eps_start, eps_end=eps_end, eps_decay_episodes=eps_decay,
+                       replay_capacity=replay_capacity, batch_size=batch_size,
+                       planning_steps=planning_steps, sparse=state_encoding != "cell",
+                       dtype=q_dtype, seed=make_seed(seed, level), agent_type=agent_type, lam=lam)
+
+    rewards = train_agent(env, agent, level, episodes, profiler=profiler, checkpoint_path=checkpoint_path,
+                          checkpoint_every=checkpoint_every, resume=resume)
+    if profiler is not NULL_PROFILER:
+        profiler.print_summary()
 
     plt.plot(rewards)
     plt.xlabel("Episode"); plt.ylabel("Return"); plt.title("Training Progress")
     plt.tight_layout(); plt.show()
 
     # Save Q-table for a visual demo later
-    import numpy as _np
-    _np.save("Q.npy", agent.Q)
-    print("Saved Q-table to Q.npy")
+    path = save_q_table("Q.npy", agent.Q)
+    print(f"Saved Q-table to {path}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--level", type=int, default=0)
     parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--profile", action="store_true", help="time each training phase and print a breakdown")
+    parser.add_argument("--profile-every", type=int, default=0, help="with --profile: also print every Nth episode")
+    parser.add_argument("--profile-out", default=None, help="with --profile: save the breakdown as .csv or .json")
+    parser.add_argument("--replay", type=int, default=0, help="experience replay buffer capacity (0 = off)")
+    parser.add_argument("--batch-size", type=int, default=32, help="with --replay: transitions replayed per step")
+    parser.add_argument("--planning-steps", type=int, default=0,
+                        help="Dyna-Q simulated updates per real step (0 = plain Q-learning)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="checkpoint file (Q-table, epsilon, episode, RNG state); off unless given")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="episodes between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue from --checkpoint if it exists")
+    parser.add_argument("--state-encoding", default="cell", choices=STATE_ENCODINGS,
+                        help="cell_treats = state is (cell, treats left), stored in a sparse Q-table")
+    parser.add_argument("--float32", action="store_true", help="keep the Q-table in float32 (half the memory)")
+    parser.add_argument("--seed", type=int, default=None, help="run seed (the agent uses one derived from seed and level)")
+    parser.add_argument("--agent", default="q", choices=sorted(AGENT_TYPES),
+                        help="q = Q-learning; qlambda / sarsa-lambda learn with eligibility traces")
+    parser.add_argument("--lam", type=float, default=0.9, help="with a trace agent: trace decay lambda")
+    parser.add_argument("--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
     args = parser.parse_args()
-    train(level=args.level, episodes=args.episodes)
+    logging.basicConfig(level=args.log_level, format="%(levelname)s %(name)s: %(message)s")
+
+    profiler = PhaseProfiler(print_every=args.profile_every) if args.profile else NULL_PROFILER
+    train(level=args.level, episodes=args.episodes, profiler=profiler,
+          replay_capacity=args.replay, batch_size=args.batch_size, planning_steps=args.planning_steps,
+          checkpoint_path=args.checkpoint, checkpoint_every=args.checkpoint_every, resume=args.resume,
+          state_encoding=args.state_encoding, q_dtype="float32" if args.float32 else "float64",
+          seed=args.seed, agent_type=args.agent, lam=args.lam)
+    if args.profile and args.profile_out:
+        profiler.export(args.profile_out)
+        print(f"Saved profile to {args.profile_out}")